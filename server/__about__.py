@@ -0,0 +1,6 @@
+#!/usr/bin/env python3
+"""
+Galaksio package metadata.
+"""
+
+__version__ = "0.4.0"
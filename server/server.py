@@ -64,6 +64,7 @@ from servlets.GalaxyAPI import (
 
 # Import error handlers
 from servlets.ErrorHandler import register_error_handlers
+from servlets.JSONProvider import OrjsonProvider
 
 # Import cleanup utilities
 from servlets.WorkflowTracker import workflow_tracker
@@ -90,6 +91,7 @@ class GalaksioServer:
         self.app = Flask(__name__, 
                         static_folder='../client/src',
                         template_folder='../client/src')
+        self.app.json = OrjsonProvider(self.app)
         self.setup_app()
         self.setup_routes()
         self.setup_background_tasks()
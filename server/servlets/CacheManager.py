@@ -4,10 +4,12 @@ Cache Manager for Galaksio
 Provides caching functionality with TTL support and cleanup.
 """
 
+import copy
 import logging
 import time
 import threading
-from typing import Any, Dict, Optional, Callable
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Callable
 from datetime import datetime, timedelta
 from functools import wraps
 
@@ -172,6 +174,53 @@ class CacheManager:
             if expired_keys:
                 logger.info(f"Cleaned up {len(expired_keys)} expired cache entries")
 
+class TTLCache:
+    """Small LRU cache with per-entry TTL, checked on read; needs no cleanup thread.
+    
+    Values are plain Galaxy API dicts handed to request handlers, which may add
+    to them before responding. As one cache serves every user of a Galaxy
+    server, values are copied in and out so a caller's changes never reach
+    another caller's hit; a copy costs microseconds against the HTTP request a
+    hit saves, and workflow tracking polls Galaxy directly rather than through
+    a cache.
+    """
+    
+    def __init__(self, max_size: int = 1000, default_ttl: float = 300):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        # Key -> (expires_at, value), ordered from least to most recently used
+        self.cache: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Get a copy of a cached value, or None if it is missing or expired."""
+        with self.lock:
+            entry = self.cache.get(key)
+            if entry is None:
+                return None
+            
+            if entry[0] <= time.monotonic():
+                del self.cache[key]
+                return None
+            
+            self.cache.move_to_end(key)
+            value = entry[1]
+        return copy.deepcopy(value)
+    
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Cache a copy of a value for ttl seconds, evicting the least recently used entry when full."""
+        value = copy.deepcopy(value)
+        with self.lock:
+            self.cache[key] = (time.monotonic() + (ttl or self.default_ttl), value)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+    
+    def clear(self):
+        """Remove all cached values."""
+        with self.lock:
+            self.cache.clear()
+
 # Decorator for caching function results
 def cache_result(ttl: int = 300, key_prefix: str = 'func_cache'):
     """Decorator to cache function results."""
@@ -148,7 +148,7 @@ def executeWorkflow(request, settings):
         # Start tracking the workflow execution
         if invocation_id:
             tracker = get_workflow_tracker(gi)
-            tracker.start_tracking(workflow_id, invocation_id)
+            tracker.start_tracking(workflow_id, invocation_id, history_id)
         
         return {
             'success': True,
@@ -466,19 +466,7 @@ def getPairedReadPatterns(request, settings):
     try:
         from .PairedReadsHandler import PairedReadsHandler
         
-        patterns = []
-        for pattern, replacement in PairedReadsHandler.PAIRED_READ_PATTERNS:
-            patterns.append({
-                'pattern': pattern,
-                'replacement': replacement,
-                'description': f"Files matching '{pattern}' will be paired with '{replacement}'"
-            })
-        
-        return {
-            'success': True,
-            'patterns': patterns,
-            'supported_extensions': list(PairedReadsHandler.SUPPORTED_EXTENSIONS)
-        }
+        return PairedReadsHandler.get_supported_patterns()
         
     except Exception as e:
         logger.error(f"Error getting paired read patterns: {e}")
@@ -6,25 +6,113 @@ Verifies and ensures compatibility with Galaxy 25.0 API changes.
 
 import logging
 import json
-from typing import Dict, List, Optional, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Tuple
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+import bioblend
 from bioblend.galaxy import GalaxyInstance
 from bioblend.galaxy.objects import GalaxyInstance as GalaxyInstanceObjects
 
+from .CacheManager import TTLCache
+
 logger = logging.getLogger(__name__)
 
+# Fields every element of a Galaxy 25.0 collection description must carry
+REQUIRED_ELEMENT_KEYS = frozenset(('name', 'src', 'id'))
+
+# Invocation states after which Galaxy no longer updates the invocation
+TERMINAL_INVOCATION_STATES = frozenset(('scheduled', 'cancelled', 'failed'))
+
+def _use_orjson_decoder(response: requests.Response, *args, **kwargs) -> requests.Response:
+    """Response hook making response.json() decode with orjson."""
+    response.json = lambda **_: orjson.loads(response.content)
+    return response
+
+def enable_connection_pooling(galaxy_instance: GalaxyInstance, pool_maxsize: int = 20):
+    """Route bioblend GET requests through a shared keep-alive session."""
+    if not isinstance(galaxy_instance, GalaxyInstance):
+        return
+    if getattr(galaxy_instance, '_pooled_session', None) is not None:
+        return
+    
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.hooks['response'].append(_use_orjson_decoder)
+    
+    def make_get_request(url: str, **kwargs) -> requests.Response:
+        # Same defaults as GalaxyClient.make_get_request, but over a pooled session
+        kwargs.setdefault('timeout', galaxy_instance.timeout)
+        kwargs.setdefault('verify', galaxy_instance.verify)
+        return session.get(url, headers=galaxy_instance.json_headers, **kwargs)
+    
+    galaxy_instance._pooled_session = session
+    galaxy_instance.make_get_request = make_get_request
+
+def _is_transient_error(error: Exception) -> bool:
+    """Check whether an error is a network/server failure rather than an API mismatch."""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                          bioblend.TimeoutException)):
+        return True
+    if isinstance(error, bioblend.ConnectionError):
+        # No status code means the request never got a response
+        return error.status_code is None or error.status_code >= 500
+    return False
+
 class GalaxyAPIVerifier:
     """Verifies Galaxy API compatibility and provides fallback methods."""
     
+    # Endpoints probed by _verify_api_endpoints, in report order
+    API_ENDPOINTS = ('workflows', 'invocations', 'histories', 'datasets', 'collections')
+    
+    # Fields requested when sampling history contents during verification
+    HISTORY_SAMPLE_KEYS = ['id', 'name', 'state', 'hid']
+    
+    # Seconds a terminal invocation stays cached (subject to LRU eviction)
+    TERMINAL_INVOCATION_TTL = 24 * 3600
+    
+    # Shared by all verifiers and keyed by (Galaxy URL, API key, ID) so users
+    # only see what they fetched themselves. Workflow details rarely change;
+    # a short TTL absorbs invocation polling storms.
+    _workflow_cache = TTLCache(max_size=512, default_ttl=300)
+    _invocation_cache = TTLCache(max_size=1024, default_ttl=2)
+    
+    __slots__ = (
+        'gi', '_gi_objects', 'galaxy_version', 'galaxy_major', 'api_version', 'is_galaxy_25_plus',
+        'compatibility_issues', 'failed_endpoints', '_issues_lock', '_history_sample', '_history_sample_lock',
+    )
+    
     def __init__(self, galaxy_instance: GalaxyInstance):
+        enable_connection_pooling(galaxy_instance)
         self.gi = galaxy_instance
-        self.gi_objects = GalaxyInstanceObjects(galaxy_instance.url, galaxy_instance.key)
+        self._gi_objects = None
         self.galaxy_version = None
+        self.galaxy_major = None
         self.api_version = None
+        self.is_galaxy_25_plus = False
         self.compatibility_issues = []
+        self.failed_endpoints = set()
+        self._issues_lock = threading.Lock()
+        self._history_sample = None
+        self._history_sample_lock = threading.Lock()
         
-        # Verify Galaxy version and API compatibility
-        self._verify_galaxy_version()
-        self._verify_api_endpoints()
+        # Verify Galaxy version and API compatibility. The version probe does
+        # not feed the endpoint checks, so overlap it with them.
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            version_check = executor.submit(self._verify_galaxy_version)
+            self._verify_api_endpoints()
+            version_check.result()
+    
+    @property
+    def gi_objects(self) -> GalaxyInstanceObjects:
+        """Object-oriented Galaxy client, built on first access."""
+        if self._gi_objects is None:
+            self._gi_objects = GalaxyInstanceObjects(self.gi.url, self.gi.key)
+        return self._gi_objects
     
     def _verify_galaxy_version(self):
         """Verify Galaxy version and store compatibility information."""
@@ -32,19 +120,26 @@ class GalaxyAPIVerifier:
             version_info = self.gi.config.get_version()
             self.galaxy_version = version_info.get('version_major', 'unknown')
             self.api_version = version_info.get('api_version', 'unknown')
+            self.is_galaxy_25_plus = bool(self.galaxy_version and self.galaxy_version.startswith('25.'))
+            try:
+                self.galaxy_major = int(str(self.galaxy_version).split('.')[0])
+            except ValueError:
+                self.galaxy_major = None
             
-            logger.info(f"Detected Galaxy version: {self.galaxy_version}")
-            logger.info(f"Detected API version: {self.api_version}")
+            logger.info("Detected Galaxy version: %s", self.galaxy_version)
+            logger.info("Detected API version: %s", self.api_version)
             
             # Check if this is Galaxy 25.0+
-            if self.galaxy_version and self.galaxy_version.startswith('25.'):
+            if self.is_galaxy_25_plus:
                 logger.info("Galaxy 25.0+ detected - applying compatibility checks")
             else:
-                logger.warning(f"Galaxy {self.galaxy_version} detected - some features may not be available")
+                logger.warning("Galaxy %s detected - some features may not be available", self.galaxy_version)
                 
         except Exception as e:
-            logger.error(f"Failed to verify Galaxy version: {e}")
-            self.compatibility_issues.append(f"Version verification failed: {str(e)}")
+            logger.error("Failed to verify Galaxy version: %s", e)
+            # Overlaps the endpoint checks, but is always reported first
+            with self._issues_lock:
+                self.compatibility_issues.insert(0, f"Version verification failed: {str(e)}")
     
     def _verify_api_endpoints(self):
         """Verify critical API endpoints are available and working."""
@@ -56,14 +151,24 @@ class GalaxyAPIVerifier:
             ('collections', self._check_collections_endpoint),
         ]
         
-        for endpoint_name, check_function in endpoints_to_check:
-            try:
-                check_function()
-                logger.info(f"✅ {endpoint_name} endpoint compatible")
-            except Exception as e:
-                error_msg = f"❌ {endpoint_name} endpoint issue: {str(e)}"
-                logger.error(error_msg)
-                self.compatibility_issues.append(error_msg)
+        # The checks are independent HTTP probes, so run them concurrently, but
+        # collect results in list order so issues are reported deterministically
+        with ThreadPoolExecutor(max_workers=len(endpoints_to_check)) as executor:
+            futures = [
+                (endpoint_name, executor.submit(check_function))
+                for endpoint_name, check_function in endpoints_to_check
+            ]
+            
+            for endpoint_name, future in futures:
+                try:
+                    future.result()
+                    logger.info("✅ %s endpoint compatible", endpoint_name)
+                except Exception as e:
+                    error_msg = f"❌ {endpoint_name} endpoint issue: {str(e)}"
+                    logger.error(error_msg)
+                    with self._issues_lock:
+                        self.failed_endpoints.add(endpoint_name)
+                        self.compatibility_issues.append(error_msg)
     
     def _check_workflows_endpoint(self):
         """Check workflows API endpoint compatibility."""
@@ -88,7 +193,7 @@ class GalaxyAPIVerifier:
                 raise ValueError(f"Expected list of invocations, got {type(invocations)}")
         except Exception as e:
             # Some Galaxy instances might not have invocations enabled
-            logger.warning(f"Invocations endpoint not available: {e}")
+            logger.warning("Invocations endpoint not available: %s", e)
             return
         
         # Test invocation details structure
@@ -98,64 +203,57 @@ class GalaxyAPIVerifier:
             if 'steps' not in invocation_details:
                 raise ValueError("Invocation steps structure has changed")
     
+    def _fetch_sample_history_contents(self) -> Tuple[List[Dict], List[Dict]]:
+        """Fetch the history list and the contents of the first history once."""
+        with self._history_sample_lock:
+            if self._history_sample is None:
+                histories = self.gi.histories.get_histories()
+                contents = []
+                if isinstance(histories, list) and len(histories) > 0:
+                    history_id = histories[0]['id']
+                    contents = self.gi.histories.show_history(
+                        history_id, contents=True, deleted=False, keys=self.HISTORY_SAMPLE_KEYS
+                    )
+                self._history_sample = (histories, contents)
+            return self._history_sample
+    
     def _check_histories_endpoint(self):
         """Check histories API endpoint compatibility."""
-        # Test getting histories
-        histories = self.gi.histories.get_histories()
+        histories, history_contents = self._fetch_sample_history_contents()
         if not isinstance(histories, list):
             raise ValueError(f"Expected list of histories, got {type(histories)}")
         
         # Test history content retrieval
         if len(histories) > 0:
-            history_id = histories[0]['id']
-            history_contents = self.gi.histories.show_history(history_id, contents=True)
             if not isinstance(history_contents, list):
                 raise ValueError(f"Expected list for history contents, got {type(history_contents)}")
     
     def _check_datasets_endpoint(self):
         """Check datasets API endpoint compatibility."""
-        # Test getting datasets from history
-        histories = self.gi.histories.get_histories()
-        if len(histories) > 0:
-            history_id = histories[0]['id']
-            datasets = self.gi.histories.show_history(history_id, contents=True)
-            
-            for dataset in datasets:
-                if 'id' in dataset and 'name' in dataset:
-                    # Basic dataset structure is intact
-                    break
-            else:
-                raise ValueError("Dataset structure has changed")
+        # Reuse the history contents fetched for the histories check
+        _, datasets = self._fetch_sample_history_contents()
+        # An empty history says nothing about the dataset structure
+        if datasets and not any('id' in dataset and 'name' in dataset for dataset in datasets):
+            raise ValueError("Dataset structure has changed")
     
     def _check_collections_endpoint(self):
         """Check collections API endpoint compatibility."""
         try:
-            # Test collection creation structure
-            test_collection = {
-                'collection_type': 'paired',
-                'name': 'test_collection',
-                'elements': [
-                    {'name': 'forward', 'src': 'hda', 'id': 'test_id_1'},
-                    {'name': 'reverse', 'src': 'hda', 'id': 'test_id_2'}
-                ]
-            }
-            
-            # We'll test the structure but not actually create a collection
-            if 'collection_type' not in test_collection:
-                raise ValueError("Collection structure has changed")
-            if 'elements' not in test_collection:
-                raise ValueError("Collection elements structure has changed")
-                
+            config = self.gi.config.get_config()
         except Exception as e:
-            logger.warning(f"Collections endpoint check failed: {e}")
+            logger.warning("Collections endpoint check failed: %s", e)
             # This might not be available in all Galaxy instances
+            return
+        
+        if not config.get('enable_dataset_collections', True):
+            raise ValueError("Dataset collections are disabled on this Galaxy server")
     
     def get_compatibility_report(self) -> Dict[str, Any]:
         """Get a comprehensive compatibility report."""
         return {
             'galaxy_version': self.galaxy_version,
             'api_version': self.api_version,
-            'is_galaxy_25_plus': self.galaxy_version and self.galaxy_version.startswith('25.'),
+            'is_galaxy_25_plus': self.is_galaxy_25_plus,
             'compatibility_issues': self.compatibility_issues,
             'issues_count': len(self.compatibility_issues),
             'is_compatible': len(self.compatibility_issues) == 0,
@@ -170,7 +268,7 @@ class GalaxyAPIVerifier:
         if self.compatibility_issues:
             recommendations.append("Review compatibility issues and consider updating API calls")
         
-        if self.galaxy_version and not self.galaxy_version.startswith('25.'):
+        if self.galaxy_version and not self.is_galaxy_25_plus:
             recommendations.append("Consider upgrading to Galaxy 25.0+ for full feature support")
         
         if not self.galaxy_version:
@@ -180,27 +278,7 @@ class GalaxyAPIVerifier:
     
     def _get_supported_features(self) -> List[str]:
         """Get list of supported features based on compatibility."""
-        features = []
-        
-        # Add features based on successful endpoint checks
-        endpoint_issues = [issue for issue in self.compatibility_issues if 'endpoint issue' in issue]
-        
-        if not any('workflows' in issue for issue in endpoint_issues):
-            features.append('workflows')
-        
-        if not any('invocations' in issue for issue in endpoint_issues):
-            features.append('invocations')
-        
-        if not any('histories' in issue for issue in endpoint_issues):
-            features.append('histories')
-        
-        if not any('datasets' in issue for issue in endpoint_issues):
-            features.append('datasets')
-        
-        if not any('collections' in issue for issue in endpoint_issues):
-            features.append('collections')
-        
-        return features
+        return [endpoint for endpoint in self.API_ENDPOINTS if endpoint not in self.failed_endpoints]
     
     def is_compatible(self) -> bool:
         """Check if the current Galaxy instance is compatible."""
@@ -209,20 +287,22 @@ class GalaxyAPIVerifier:
     def get_safe_workflow_invocation(self, workflow_id: str, history_id: str,
                                    inputs: Dict, params: Dict = None) -> Dict:
         """Safely invoke workflow with compatibility checks."""
+        if not self.is_galaxy_25_plus:
+            return self._invoke_workflow_legacy(workflow_id, history_id, inputs, params)
+        
         try:
             # Try Galaxy 25.0+ method first
-            if self.is_galaxy_25_plus:
-                return self._invoke_workflow_25(workflow_id, history_id, inputs, params)
-            else:
-                # Fallback to legacy method
-                return self._invoke_workflow_legacy(workflow_id, history_id, inputs, params)
+            return self._invoke_workflow_25(workflow_id, history_id, inputs, params)
         except Exception as e:
-            logger.error(f"Workflow invocation failed: {e}")
-            # Try fallback method
+            if _is_transient_error(e):
+                # Resending the same request to the legacy method would only add load
+                logger.error("Workflow invocation failed: %s", e)
+                raise
+            logger.warning("Workflow invocation failed, trying legacy method: %s", e)
             try:
                 return self._invoke_workflow_legacy(workflow_id, history_id, inputs, params)
             except Exception as fallback_error:
-                logger.error(f"Fallback workflow invocation also failed: {fallback_error}")
+                logger.error("Fallback workflow invocation also failed: %s", fallback_error)
                 raise
     
     def _invoke_workflow_25(self, workflow_id: str, history_id: str,
@@ -255,12 +335,21 @@ class GalaxyAPIVerifier:
         
         return self.gi.workflows.invoke_workflow(**invocation_params)
     
-    def get_safe_history_contents(self, history_id: str, contents: bool = True) -> List[Dict]:
-        """Safely get history contents with compatibility checks."""
+    def get_safe_history_contents(self, history_id: str, contents: bool = True,
+                                  keys: Optional[List[str]] = None,
+                                  deleted: Optional[bool] = None) -> List[Dict]:
+        """Safely get history contents with compatibility checks.
+        
+        Pass ``keys`` to limit each content item to the listed fields and
+        ``deleted=False`` to skip deleted items, which keeps large histories cheap.
+        """
         try:
+            if contents and (keys or deleted is not None):
+                return self.gi.histories.show_history(history_id, contents=True,
+                                                      deleted=deleted, keys=keys)
             return self.gi.histories.show_history(history_id, contents=contents)
         except Exception as e:
-            logger.error(f"History content retrieval failed: {e}")
+            logger.error("History content retrieval failed: %s", e)
             # Try alternative method for older Galaxy versions
             try:
                 history = self.gi.histories.show_history(history_id)
@@ -268,25 +357,26 @@ class GalaxyAPIVerifier:
                     return history['contents']
                 return [history] if not contents else []
             except Exception as fallback_error:
-                logger.error(f"Fallback history retrieval failed: {fallback_error}")
+                logger.error("Fallback history retrieval failed: %s", fallback_error)
                 raise
     
     def create_safe_collection(self, history_id: str, collection_description: Dict) -> Dict:
         """Safely create dataset collection with compatibility checks."""
+        if not self.is_galaxy_25_plus:
+            return self._create_collection_legacy(history_id, collection_description)
+        
         try:
-            # Try Galaxy 25.0+ method
-            if self.is_galaxy_25_plus:
-                return self._create_collection_25(history_id, collection_description)
-            else:
-                # Fallback to legacy method
-                return self._create_collection_legacy(history_id, collection_description)
+            # Try Galaxy 25.0+ method first
+            return self._create_collection_25(history_id, collection_description)
         except Exception as e:
-            logger.error(f"Collection creation failed: {e}")
-            # Try fallback method
+            if _is_transient_error(e):
+                logger.error("Collection creation failed: %s", e)
+                raise
+            logger.warning("Collection creation failed, trying legacy method: %s", e)
             try:
                 return self._create_collection_legacy(history_id, collection_description)
             except Exception as fallback_error:
-                logger.error(f"Fallback collection creation also failed: {fallback_error}")
+                logger.error("Fallback collection creation also failed: %s", fallback_error)
                 raise
     
     def _create_collection_25(self, history_id: str, collection_description: Dict) -> Dict:
@@ -302,9 +392,8 @@ class GalaxyAPIVerifier:
             raise ValueError("Collection elements are required")
         
         # Validate elements structure for Galaxy 25.0
-        for element in collection_description['elements']:
-            if 'name' not in element or 'src' not in element or 'id' not in element:
-                raise ValueError("Each collection element must have name, src, and id")
+        if not all(REQUIRED_ELEMENT_KEYS.issubset(element) for element in collection_description['elements']):
+            raise ValueError("Each collection element must have name, src, and id")
         
         return self.gi.histories.create_dataset_collection(
             history_id=history_id,
@@ -323,49 +412,85 @@ class GalaxyAPIVerifier:
         if 'elements' not in collection_description:
             raise ValueError("Collection elements are required")
         
-        # Try to create with legacy structure
+        # Galaxy releases before 21 only accept the alternative structure
+        if self.galaxy_major is not None and self.galaxy_major < 21:
+            return self.gi.histories.create_dataset_collection(
+                history_id=history_id,
+                collection_description=self._to_legacy_collection_description(collection_description)
+            )
+        
+        if self.galaxy_major is not None:
+            return self.gi.histories.create_dataset_collection(
+                history_id=history_id,
+                collection_description=collection_description
+            )
+        
+        # Unknown version: try the current structure first
         try:
             return self.gi.histories.create_dataset_collection(
                 history_id=history_id,
                 collection_description=collection_description
             )
         except Exception as e:
-            logger.warning(f"Legacy collection creation failed, trying alternative structure: {e}")
-            
-            # Try alternative structure for older versions
-            alt_description = {
-                'name': collection_description['name'],
-                'type': collection_description['collection_type'],
-                'element_identifiers': collection_description['elements']
-            }
+            logger.warning("Legacy collection creation failed, trying alternative structure: %s", e)
             
             return self.gi.histories.create_dataset_collection(
                 history_id=history_id,
-                collection_description=alt_description
+                collection_description=self._to_legacy_collection_description(collection_description)
             )
     
+    def _to_legacy_collection_description(self, collection_description: Dict) -> Dict:
+        """Convert a collection description to the structure used by older Galaxy versions."""
+        return {
+            'name': collection_description['name'],
+            'type': collection_description['collection_type'],
+            'element_identifiers': collection_description['elements']
+        }
+    
     def get_safe_invocation_status(self, invocation_id: str) -> Dict:
         """Safely get invocation status with compatibility checks."""
+        cache_key = (self.gi.url, self.gi.key, invocation_id)
+        invocation = self._invocation_cache.get(cache_key)
+        if invocation is not None:
+            return invocation
+        
         try:
-            return self.gi.invocations.show_invocation(invocation_id)
+            invocation = self.gi.invocations.show_invocation(invocation_id)
+            # Terminal invocations no longer change, so keep them until evicted
+            ttl = self.TERMINAL_INVOCATION_TTL if invocation.get('state') in TERMINAL_INVOCATION_STATES else None
+            self._invocation_cache.set(cache_key, invocation, ttl)
+            return invocation
         except Exception as e:
-            logger.error(f"Invocation status retrieval failed: {e}")
+            logger.error("Invocation status retrieval failed: %s", e)
             raise
     
     def get_safe_workflow_details(self, workflow_id: str) -> Dict:
         """Safely get workflow details with compatibility checks."""
+        cache_key = (self.gi.url, self.gi.key, workflow_id)
+        workflow = self._workflow_cache.get(cache_key)
+        if workflow is not None:
+            return workflow
+        
         try:
-            return self.gi.workflows.show_workflow(workflow_id)
+            workflow = self.gi.workflows.show_workflow(workflow_id)
+            self._workflow_cache.set(cache_key, workflow)
+            return workflow
         except Exception as e:
-            logger.error(f"Workflow details retrieval failed: {e}")
+            logger.error("Workflow details retrieval failed: %s", e)
             raise
 
-# Global API verifier instance
-_api_verifier = None
+# API verifiers, one per Galaxy server and API key
+_api_verifiers: Dict[Tuple[str, str], GalaxyAPIVerifier] = {}
+_api_verifiers_lock = threading.Lock()
 
 def get_api_verifier(galaxy_instance: GalaxyInstance) -> GalaxyAPIVerifier:
-    """Get or create the global API verifier."""
-    global _api_verifier
-    if _api_verifier is None:
-        _api_verifier = GalaxyAPIVerifier(galaxy_instance)
-    return _api_verifier
+    """Get or create the API verifier for the given Galaxy instance."""
+    cache_key = (galaxy_instance.url, galaxy_instance.key)
+    verifier = _api_verifiers.get(cache_key)
+    if verifier is None:
+        with _api_verifiers_lock:
+            verifier = _api_verifiers.get(cache_key)
+            if verifier is None:
+                verifier = GalaxyAPIVerifier(galaxy_instance)
+                _api_verifiers[cache_key] = verifier
+    return verifier
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+JSON Provider for Galaksio
+Serializes Flask JSON responses and parses request bodies with orjson.
+"""
+
+import logging
+import re
+from typing import Any
+
+import orjson
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+
+logger = logging.getLogger(__name__)
+
+# Characters the stdlib encoder escapes under ensure_ascii but orjson writes
+# as is; JSON syntax is plain ASCII, so they only occur inside strings
+NON_ASCII_RE = re.compile('[^\x00-\x7e]')
+
+def _escape_non_ascii(match: re.Match) -> str:
+    """Escape a character as the stdlib encoder does, as a \\u escape or surrogate pair."""
+    code = ord(match.group())
+    if code < 0x10000:
+        return f'\\u{code:04x}'
+    code -= 0x10000
+    return f'\\u{0xd800 | (code >> 10):04x}\\u{0xdc00 | (code & 0x3ff):04x}'
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider writing jsonify responses and parsing request bodies with orjson.
+    
+    Responses are byte for byte what Flask's default provider writes: dates go
+    through default() as HTTP dates, non-ASCII characters are escaped, and
+    anything orjson rejects, such as non-string keys, is left to the stdlib
+    encoder. dumps() keeps the stdlib encoder, as its separators differ from
+    orjson's compact output.
+    """
+    
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        """Serialize the given arguments as a JSON response."""
+        obj = self._prepare_response_obj(args, kwargs)
+        
+        option = orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            option |= orjson.OPT_INDENT_2
+        
+        try:
+            data = orjson.dumps(obj, default=self.default, option=option).decode()
+        except orjson.JSONEncodeError:
+            # Non-string keys and integers beyond 64 bits are left to the stdlib
+            # encoder, which also raises like before for unsupported values
+            return super().response(obj)
+        
+        if self.ensure_ascii and (not data.isascii() or '\x7f' in data):
+            data = NON_ASCII_RE.sub(_escape_non_ascii, data)
+        return self._app.response_class(f"{data}\n", mimetype=self.mimetype)
+    
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        """Deserialize data as JSON."""
+        if kwargs:
+            return super().loads(s, **kwargs)
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            # The stdlib decoder also accepts NaN, Infinity and integers beyond 64 bits
+            return super().loads(s)
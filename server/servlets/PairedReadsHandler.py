@@ -9,31 +9,49 @@ import re
 import logging
 from typing import Dict, List, Tuple, Optional, Set
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from bioblend.galaxy import GalaxyInstance
 
 logger = logging.getLogger(__name__)
 
+# Pair indicators that may be followed by an Illumina "_001" lane/chunk number
+ILLUMINA_INDICATORS = ('_r1', '_r2', '_1', '_2')
+
+def _indicator_variants(indicator_mates: Dict[str, str]) -> List[Tuple[str, str]]:
+    """List (indicator, mate indicator) pairs, adding the Illumina _001 lane variants."""
+    variants = []
+    for indicator, mate in indicator_mates.items():
+        variants.append((indicator, mate))
+        if indicator in ILLUMINA_INDICATORS:
+            variants.append((indicator + '_001', mate + '_001'))
+    return variants
+
+def _build_suffix_mates(indicator_mates: Dict[str, str], extensions: Set[str]) -> Dict[str, str]:
+    """Build the lower-cased file suffix -> lower-cased mate suffix table."""
+    suffix_mates = {}
+    for suffix, mate_suffix in _indicator_variants(indicator_mates):
+        for extension in extensions:
+            suffix_mates[suffix + extension] = (mate_suffix + extension).lower()
+    return suffix_mates
+
 class PairedReadsHandler:
     """Handler for detecting and managing paired-end sequencing reads."""
     
-    # Common patterns for paired-end read files
-    PAIRED_READ_PATTERNS = [
-        # Standard Illumina patterns
-        (r'(.+)_R1(_001)?\.(\w+)$', r'\1_R2\2.\3'),  # file_R1.fastq -> file_R2.fastq
-        (r'(.+)_R2(_001)?\.(\w+)$', r'\1_R1\2.\3'),  # file_R2.fastq -> file_R1.fastq
-        (r'(.+)_1(_001)?\.(\w+)$', r'\1_2\2.\3'),    # file_1.fastq -> file_2.fastq
-        (r'(.+)_2(_001)?\.(\w+)$', r'\1_1\2.\3'),    # file_2.fastq -> file_1.fastq
-        
-        # Alternative patterns
-        (r'(.+)_read1\.(\w+)$', r'\1_read2.\2'),      # file_read1.fastq -> file_read2.fastq
-        (r'(.+)_read2\.(\w+)$', r'\1_read1.\2'),      # file_read2.fastq -> file_read1.fastq
-        (r'(.+)\.R1\.(\w+)$', r'\1.R2.\2'),          # file.R1.fastq -> file.R2.fastq
-        (r'(.+)\.R2\.(\w+)$', r'\1.R1.\2'),          # file.R2.fastq -> file.R1.fastq
-        
-        # PacBio/ONT patterns
-        (r'(.+)_forward\.(\w+)$', r'\1_reverse.\2'),  # file_forward.fastq -> file_reverse.fastq
-        (r'(.+)_reverse\.(\w+)$', r'\1_forward.\2'),  # file_reverse.fastq -> file_forward.fastq
-    ]
+    # Pair indicator (lower-cased) -> indicator of the mate file
+    PAIR_INDICATOR_MATES = {
+        '_r1': '_R2', '_r2': '_R1',
+        '_1': '_2', '_2': '_1',
+        '_read1': '_read2', '_read2': '_read1',
+        '.r1': '.R2', '.r2': '.R1',
+        '_forward': '_reverse', '_reverse': '_forward',
+    }
+    
+    # Finds the first pair indicator that is followed by a '.' or '_' separator;
+    # the base name is the slice in front of it. The separator is consumed
+    # rather than matched with a lookahead to keep the pattern RE2-compatible.
+    _PAIR_TAG_RE = re.compile(
+        r'(?i)(?:_R[12]|_[12]|_read[12]|\.R[12]|_forward|_reverse)[._]'
+    )
     
     # Supported file extensions
     SUPPORTED_EXTENSIONS = {
@@ -42,22 +60,49 @@ class PairedReadsHandler:
         '.bam', '.sam'
     }
     
+    # str.endswith accepts a tuple and checks every extension in one call
+    _EXTENSION_SUFFIXES = tuple(SUPPORTED_EXTENSIONS)
+    
+    # Lower-cased "<indicator><extension>" suffix -> lower-cased mate suffix, crossing
+    # PAIR_INDICATOR_MATES (plus Illumina _001 lane variants) with the
+    # supported extensions; _SUFFIX_LENGTHS lists the distinct lengths, longest first
+    _SUFFIX_MATES = _build_suffix_mates(PAIR_INDICATOR_MATES, SUPPORTED_EXTENSIONS)
+    _SUFFIX_LENGTHS = sorted({len(suffix) for suffix in _SUFFIX_MATES}, reverse=True)
+    
+    # Pair indicator tokens scored by _calculate_pair_confidence, strongest first
+    CONFIDENCE_TOKENS = ('_r1', '_r2', '_1', '_2')
+    PATTERN_CONFIDENCE = ((('_r1', '_r2'), 0.4), (('_1', '_2'), 0.3))
+    
+    # Dataset fields needed for pairing; requested instead of full records
+    DATASET_KEYS = ['id', 'name', 'hid', 'state', 'file_size', 'data_type']
+    
+    # Maximum concurrent collection creations in auto_pair_all_reads
+    COLLECTION_WORKERS = 8
+    
     def __init__(self, galaxy_instance: GalaxyInstance):
         self.gi = galaxy_instance
+        self._verifier = None
+    
+    def _get_verifier(self):
+        """Get the API verifier for this handler's Galaxy instance, created on first use."""
+        if self._verifier is None:
+            # Import here to avoid circular imports
+            from .GalaxyAPIVerifier import get_api_verifier
+            self._verifier = get_api_verifier(self.gi)
+        return self._verifier
         
     def detect_paired_reads(self, history_id: str) -> Dict[str, List[Dict]]:
         """
         Detect paired-end reads in a Galaxy history.
         """
         try:
-            # Import here to avoid circular imports
-            from .GalaxyAPIVerifier import get_api_verifier
-            
             # Get API verifier for compatibility checks
-            verifier = get_api_verifier(self.gi)
+            verifier = self._get_verifier()
             
             # Get history contents using safe method
-            datasets = verifier.get_safe_history_contents(history_id, contents=True)
+            datasets = verifier.get_safe_history_contents(
+                history_id, contents=True, deleted=False, keys=self.DATASET_KEYS
+            )
             
             # Filter for sequencing files
             sequencing_files = []
@@ -66,15 +111,16 @@ class PairedReadsHandler:
                     sequencing_files.append(dataset)
             
             # Detect pairs
-            paired_groups = self._group_paired_files(sequencing_files)
+            paired_groups, paired_ids = self._group_paired_files(sequencing_files)
+            unpaired_files = [f for f in sequencing_files if f['id'] not in paired_ids]
             
             # Build result
             result = {
                 'success': True,
                 'paired_groups': paired_groups,
-                'unpaired_files': self._get_unpaired_files(sequencing_files, paired_groups),
+                'unpaired_files': unpaired_files,
                 'total_pairs': len(paired_groups),
-                'total_unpaired': len(sequencing_files) - sum(len(group['files']) for group in paired_groups),
+                'total_unpaired': len(unpaired_files),
                 'compatibility_report': verifier.get_compatibility_report()
             }
             
@@ -94,68 +140,72 @@ class PairedReadsHandler:
         """Check if a dataset is a sequencing file."""
         try:
             # Check file extension
-            name = dataset.get('name', '').lower()
-            return any(name.endswith(ext) for ext in self.SUPPORTED_EXTENSIONS)
+            return dataset.get('name', '').lower().endswith(self._EXTENSION_SUFFIXES)
         except Exception:
             return False
     
-    def _group_paired_files(self, files: List[Dict]) -> List[Dict]:
-        """Group files into paired sets."""
+    def _group_paired_files(self, files: List[Dict]) -> Tuple[List[Dict], Set[str]]:
+        """Group files into paired sets, returning the groups and the IDs of the paired files."""
         paired_groups = []
-        processed_files = set()
+        paired_ids = set()
+        
+        # Lower-case each name once, and index files by lower-cased name so
+        # mates are found with one lookup
+        names_lower = [file_info.get('name', '').lower() for file_info in files]
+        files_by_name = {}
+        for name_lower, file_info in zip(names_lower, files):
+            files_by_name.setdefault(name_lower, (name_lower, file_info))
         
-        for file1 in files:
-            if file1['id'] in processed_files:
+        for name1, file1 in zip(names_lower, files):
+            if file1['id'] in paired_ids:
                 continue
                 
             # Find potential pair
-            file2 = self._find_pair(file1, files)
+            pair = self._find_pair(file1, name1, files_by_name)
             
-            if file2:
+            if pair:
+                name2, file2 = pair
                 # Create paired group
                 pair_group = {
                     'group_id': f"pair_{len(paired_groups) + 1}",
                     'files': [file1, file2],
-                    'pair_type': self._determine_pair_type(file1, file2),
-                    'confidence': self._calculate_pair_confidence(file1, file2),
+                    'pair_type': self._determine_pair_type(name1, name2),
+                    'confidence': self._calculate_pair_confidence(file1, file2, name1, name2),
                     'suggested_name': self._generate_suggested_name(file1, file2)
                 }
                 paired_groups.append(pair_group)
-                processed_files.add(file1['id'])
-                processed_files.add(file2['id'])
-            else:
-                # Mark as processed (will be added to unpaired)
-                processed_files.add(file1['id'])
+                paired_ids.add(file1['id'])
+                paired_ids.add(file2['id'])
         
-        return paired_groups
+        return paired_groups, paired_ids
     
-    def _find_pair(self, file1: Dict, files: List[Dict]) -> Optional[Dict]:
-        """Find the paired file for the given file."""
-        file1_name = file1.get('name', '')
-        
-        for pattern, replacement in self.PAIRED_READ_PATTERNS:
-            # Try to find expected pair name
-            expected_pair_name = re.sub(pattern, replacement, file1_name, flags=re.IGNORECASE)
-            
-            if expected_pair_name != file1_name:  # Pattern matched
-                # Look for file with expected name
-                for file2 in files:
-                    if file2['id'] != file1['id']:
-                        file2_name = file2.get('name', '')
-                        if self._names_match(file2_name, expected_pair_name):
-                            return file2
+    def _find_pair(self, file1: Dict, name1: str,
+                   files_by_name: Dict[str, Tuple[str, Dict]]) -> Optional[Tuple[str, Dict]]:
+        """Find the (lower-cased name, file) of the paired file for the given file."""
+        expected_pair_name = self._mate_name(name1)
+        if expected_pair_name is None:
+            return None
         
+        # Look for file with expected name (case-insensitive)
+        pair = files_by_name.get(expected_pair_name)
+        if pair is not None and pair[1]['id'] != file1['id']:
+            return pair
         return None
     
-    def _names_match(self, name1: str, name2: str) -> bool:
-        """Check if two file names match (case-insensitive)."""
-        return name1.lower() == name2.lower()
+    @classmethod
+    def _mate_name(cls, name_lower: str) -> Optional[str]:
+        """Get the lower-cased name of the mate file, or None if the name has no pair indicator."""
+        for length in cls._SUFFIX_LENGTHS:
+            # The base name in front of the suffix must not be empty
+            if length >= len(name_lower):
+                continue
+            mate_suffix = cls._SUFFIX_MATES.get(name_lower[-length:])
+            if mate_suffix is not None:
+                return name_lower[:-length] + mate_suffix
+        return None
     
-    def _determine_pair_type(self, file1: Dict, file2: Dict) -> str:
-        """Determine the type of paired reads."""
-        name1 = file1.get('name', '').lower()
-        name2 = file2.get('name', '').lower()
-        
+    def _determine_pair_type(self, name1: str, name2: str) -> str:
+        """Determine the type of paired reads from the lower-cased file names."""
         if '_r1' in name1 and '_r2' in name2:
             return 'illumina_r1_r2'
         elif '_r2' in name1 and '_r1' in name2:
@@ -171,18 +221,18 @@ class PairedReadsHandler:
         else:
             return 'unknown'
     
-    def _calculate_pair_confidence(self, file1: Dict, file2: Dict) -> float:
-        """Calculate confidence score for the pair (0.0 to 1.0)."""
+    def _calculate_pair_confidence(self, file1: Dict, file2: Dict, name1: str, name2: str) -> float:
+        """Calculate confidence score for the pair (0.0 to 1.0), given the lower-cased file names."""
         confidence = 0.0
         
-        name1 = file1.get('name', '').lower()
-        name2 = file2.get('name', '').lower()
-        
-        # Check for standard patterns
-        if ('_r1' in name1 and '_r2' in name2) or ('_r2' in name1 and '_r1' in name2):
-            confidence += 0.4
-        elif ('_1' in name1 and '_2' in name2) or ('_2' in name1 and '_1' in name2):
-            confidence += 0.3
+        # Check for standard patterns, scanning each name once for all tokens
+        tokens1 = {token for token in self.CONFIDENCE_TOKENS if token in name1}
+        if tokens1:
+            tokens2 = {token for token in self.CONFIDENCE_TOKENS if token in name2}
+            for (mate1, mate2), score in self.PATTERN_CONFIDENCE:
+                if (mate1 in tokens1 and mate2 in tokens2) or (mate2 in tokens1 and mate1 in tokens2):
+                    confidence += score
+                    break
         
         # Check file sizes (should be similar for paired reads)
         size1 = file1.get('file_size', 0)
@@ -202,26 +252,21 @@ class PairedReadsHandler:
     def _generate_suggested_name(self, file1: Dict, file2: Dict) -> str:
         """Generate a suggested name for the paired group."""
         name1 = file1.get('name', '')
-        name2 = file2.get('name', '')
         
-        # Extract base name by removing pair indicators
-        base_name1 = re.sub(r'(_R1|_R2|_1|_2|_read1|_read2|\.R1|\.R2|_forward|_reverse).*$', '', name1, flags=re.IGNORECASE)
-        base_name2 = re.sub(r'(_R1|_R2|_1|_2|_read1|_read2|\.R1|\.R2|_forward|_reverse).*$', '', name2, flags=re.IGNORECASE)
+        # Mates share the base name in front of the pair indicator, so one name suffices
+        match = self._PAIR_TAG_RE.search(name1)
+        if match:
+            return f"{name1[:match.start()]}_paired"
         
-        # Use the shorter base name
-        suggested_base = min(base_name1, base_name2, key=len)
+        # Otherwise use the shorter base name, dropping the extension when no
+        # pair indicator is found
+        name2 = file2.get('name', '')
+        match = self._PAIR_TAG_RE.search(name2)
+        base_name2 = name2[:match.start()] if match else os.path.splitext(name2)[0]
+        suggested_base = min(os.path.splitext(name1)[0], base_name2, key=len)
         
         return f"{suggested_base}_paired"
     
-    def _get_unpaired_files(self, all_files: List[Dict], paired_groups: List[Dict]) -> List[Dict]:
-        """Get files that are not part of any pair."""
-        paired_file_ids = set()
-        for group in paired_groups:
-            for file_info in group['files']:
-                paired_file_ids.add(file_info['id'])
-        
-        return [file_info for file_info in all_files if file_info['id'] not in paired_file_ids]
-    
     def create_paired_collection(self, history_id: str, paired_group: Dict) -> Dict:
         """
         Create a paired collection in Galaxy from detected paired reads.
@@ -236,11 +281,8 @@ class PairedReadsHandler:
             file1, file2 = paired_group['files']
             collection_name = paired_group.get('suggested_name', 'paired_collection')
             
-            # Import here to avoid circular imports
-            from .GalaxyAPIVerifier import get_api_verifier
-            
             # Get API verifier for compatibility checks
-            verifier = get_api_verifier(self.gi)
+            verifier = self._get_verifier()
             
             # Create dataset collection description
             collection_description = {
@@ -293,11 +335,16 @@ class PairedReadsHandler:
             
             if create_collections:
                 # Create collections for high-confidence pairs
-                for group in paired_groups:
-                    if group['confidence'] >= 0.7:  # High confidence threshold
-                        collection_result = self.create_paired_collection(history_id, group)
-                        if collection_result['success']:
-                            created_collections.append(collection_result)
+                high_confidence_groups = [g for g in paired_groups if g['confidence'] >= 0.7]
+                
+                # Each creation is a blocking Galaxy request, so issue them concurrently
+                if high_confidence_groups:
+                    with ThreadPoolExecutor(max_workers=self.COLLECTION_WORKERS) as executor:
+                        collection_results = executor.map(
+                            lambda group: self.create_paired_collection(history_id, group),
+                            high_confidence_groups
+                        )
+                        created_collections = [r for r in collection_results if r['success']]
             
             return {
                 'success': True,
@@ -306,7 +353,7 @@ class PairedReadsHandler:
                 'unpaired_files': detection_result['unpaired_files'],
                 'summary': {
                     'total_pairs': len(paired_groups),
-                    'high_confidence_pairs': len([g for g in paired_groups if g['confidence'] >= 0.7]),
+                    'high_confidence_pairs': sum(1 for g in paired_groups if g['confidence'] >= 0.7),
                     'collections_created': len(created_collections),
                     'unpaired_count': len(detection_result['unpaired_files'])
                 },
@@ -320,20 +367,27 @@ class PairedReadsHandler:
                 'error': str(e)
             }
 
-    def get_supported_patterns(self) -> Dict:
+    @classmethod
+    def get_supported_patterns(cls) -> Dict:
         """Get supported paired read patterns and file extensions."""
+        # Built from the same indicator table _mate_name matches against
+        variants = _indicator_variants(cls.PAIR_INDICATOR_MATES)
+        # Every indicator is also some file's mate, which carries its display case
+        display_case = {mate.lower(): mate for _, mate in variants}
         patterns = []
-        for pattern, replacement in self.PAIRED_READ_PATTERNS:
+        for indicator, mate in variants:
+            pattern = f"*{display_case[indicator]}.<extension>"
+            replacement = f"*{mate}.<extension>"
             patterns.append({
                 'pattern': pattern,
                 'replacement': replacement,
-                'description': f"Files matching '{pattern}' will be paired with '{replacement}'"
+                'description': f"Files matching '{pattern}' will be paired with '{replacement}' (case-insensitive)"
             })
         
         return {
             'success': True,
             'patterns': patterns,
-            'supported_extensions': list(self.SUPPORTED_EXTENSIONS)
+            'supported_extensions': list(cls.SUPPORTED_EXTENSIONS)
         }
 
 def get_paired_reads_handler(galaxy_instance: GalaxyInstance) -> PairedReadsHandler:
@@ -4,27 +4,35 @@ Rate Limiter for Galaksio
 Provides rate limiting functionality to prevent abuse.
 """
 
+import heapq
+import itertools
 import logging
 import time
 import threading
-from typing import Dict, Optional, Callable
-from collections import defaultdict, deque
+from typing import Dict, List, Optional, Callable, Tuple
 from functools import wraps
-from flask import request, jsonify
+from flask import g, request, jsonify
 
 logger = logging.getLogger(__name__)
 
 class RateLimiter:
-    """Rate limiter implementation using sliding window algorithm."""
+    """Rate limiter implementation using per-key token buckets."""
+    
+    # Buckets are spread over independently locked shards to cut contention
+    SHARD_COUNT = 32
+    # Idle buckets are swept once every this many checks
+    CLEANUP_INTERVAL = 10000
     
     def __init__(self, default_requests: int = 100, default_window: int = 60):
         self.default_requests = default_requests
         self.default_window = default_window
-        self.requests: Dict[str, deque] = defaultdict(deque)
+        # Each shard maps key -> [tokens, last_refill]
+        self.shards: List[Tuple[threading.Lock, Dict[str, List[float]]]] = [
+            (threading.Lock(), {}) for _ in range(self.SHARD_COUNT)
+        ]
         self.limits: Dict[str, Dict] = {}
         self.lock = threading.Lock()
-        self.cleanup_thread = None
-        self.start_cleanup_thread()
+        self._check_counter = itertools.count(1)
     
     def set_limit(self, key: str, requests: int, window: int):
         """Set rate limit for a specific key."""
@@ -35,121 +43,153 @@ class RateLimiter:
             }
             logger.debug(f"Rate limit set for {key}: {requests} requests per {window} seconds")
     
+    def _get_limit(self, key: str) -> Dict:
+        """Get the configured limit for a key, or the default limit."""
+        return self.limits.get(key, {
+            'requests': self.default_requests,
+            'window': self.default_window
+        })
+    
+    def _get_shard(self, key: str) -> Tuple[threading.Lock, Dict[str, List[float]]]:
+        """Get the lock and bucket dict of the shard holding a key."""
+        return self.shards[hash(key) % self.SHARD_COUNT]
+    
     def check_rate_limit(self, key: str) -> Dict:
         """Check if request is allowed."""
-        with self.lock:
-            current_time = time.time()
-            
-            # Get limit for this key
-            limit = self.limits.get(key, {
-                'requests': self.default_requests,
-                'window': self.default_window
-            })
-            
-            # Get request timestamps for this key
-            request_times = self.requests[key]
-            
-            # Remove old requests outside the window
-            window_start = current_time - limit['window']
-            while request_times and request_times[0] < window_start:
-                request_times.popleft()
-            
-            # Check if limit exceeded
-            if len(request_times) >= limit['requests']:
-                return {
-                    'allowed': False,
-                    'remaining': 0,
-                    'reset_time': request_times[0] + limit['window'] if request_times else current_time,
-                    'limit': limit['requests'],
-                    'window': limit['window']
-                }
-            
-            # Add current request
-            request_times.append(current_time)
-            
+        # Amortize idle bucket eviction over incoming requests
+        if next(self._check_counter) % self.CLEANUP_INTERVAL == 0:
+            self.cleanup_old_requests()
+        
+        limit = self._get_limit(key)
+        capacity = limit['requests']
+        refill_rate = capacity / limit['window']  # tokens per second
+        
+        shard_lock, buckets = self._get_shard(key)
+        # Buckets are timed on the monotonic clock so wall-clock jumps cannot
+        # drain or overfill them
+        current_time = time.monotonic()
+        
+        # Only the bucket update itself runs under the shard lock
+        with shard_lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                allowed = True
+                tokens = capacity - 1
+                buckets[key] = [tokens, current_time]
+            else:
+                # Refill the bucket for the time elapsed since the last request;
+                # a racing thread may have read the clock after us
+                elapsed = current_time - bucket[1]
+                if elapsed > 0:
+                    bucket[0] = min(capacity, bucket[0] + elapsed * refill_rate)
+                    bucket[1] = current_time
+                tokens = bucket[0]
+                
+                # Consume a token for the current request
+                allowed = tokens >= 1
+                if allowed:
+                    tokens -= 1
+                    bucket[0] = tokens
+        
+        if not allowed:
+            reset_after = (1 - tokens) / refill_rate
             return {
-                'allowed': True,
-                'remaining': limit['requests'] - len(request_times),
-                'reset_time': request_times[0] + limit['window'] if request_times else current_time,
-                'limit': limit['requests'],
+                'allowed': False,
+                'remaining': 0,
+                'reset_after': reset_after,
+                'reset_time': time.time() + reset_after,
+                'limit': capacity,
                 'window': limit['window']
             }
+        
+        reset_after = (capacity - tokens) / refill_rate
+        return {
+            'allowed': True,
+            'remaining': int(tokens),
+            'reset_after': reset_after,
+            'reset_time': time.time() + reset_after,
+            'limit': capacity,
+            'window': limit['window']
+        }
     
     def get_client_key(self, request_type: str = 'default') -> str:
         """Get client key for rate limiting."""
+        # Reuse the key already computed for this request
+        cache_attr = f"rl_key_{request_type}"
+        client_key = g.get(cache_attr)
+        if client_key is not None:
+            return client_key
+        
         # Try to get client IP
         ip = request.environ.get('HTTP_X_FORWARDED_FOR', request.environ.get('REMOTE_ADDR', 'unknown'))
         
-        # Try to get API key if available
-        api_key = request.headers.get('X-API-Key') or request.json.get('key') if request.json else None
+        # Try to get API key if available, parsing the body only without the header
+        api_key = request.headers.get('X-API-Key')
+        if not api_key:
+            payload = request.get_json(silent=True)
+            api_key = payload.get('key') if isinstance(payload, dict) else None
         
-        # Try to get user agent
-        user_agent = request.headers.get('User-Agent', 'unknown')
-        
-        # Create unique key
+        # Create unique key; the client-controlled User-Agent is deliberately not
+        # part of it, as varying it would hand one client many buckets
         if api_key:
-            return f"{request_type}:{api_key}"
+            client_key = f"{request_type}:{api_key}"
         else:
-            return f"{request_type}:{ip}:{hash(user_agent) % 10000}"
-    
-    def start_cleanup_thread(self):
-        """Start background cleanup thread."""
-        def cleanup():
-            while True:
-                try:
-                    time.sleep(300)  # Clean up every 5 minutes
-                    self.cleanup_old_requests()
-                except Exception as e:
-                    logger.error(f"Error in rate limiter cleanup thread: {e}")
-        
-        self.cleanup_thread = threading.Thread(target=cleanup, daemon=True)
-        self.cleanup_thread.start()
-        logger.info("Rate limiter cleanup thread started")
+            client_key = f"{request_type}:{ip}"
+        
+        setattr(g, cache_attr, client_key)
+        return client_key
     
     def cleanup_old_requests(self):
-        """Clean up old request records."""
-        with self.lock:
-            current_time = time.time()
-            keys_to_remove = []
-            
-            for key, request_times in self.requests.items():
-                # Remove old requests
-                window_start = current_time - 3600  # Keep last hour
-                while request_times and request_times[0] < window_start:
-                    request_times.popleft()
-                
-                # Remove empty keys
-                if not request_times:
-                    keys_to_remove.append(key)
-            
-            for key in keys_to_remove:
-                del self.requests[key]
+        """Clean up buckets of idle clients."""
+        current_time = time.monotonic()
+        removed = 0
+        
+        for shard_lock, buckets in self.shards:
+            # Walk a snapshot so requests are only blocked for one key at a time
+            with shard_lock:
+                keys = list(buckets)
             
-            logger.debug(f"Rate limiter cleanup completed, removed {len(keys_to_remove)} keys")
+            for key in keys:
+                window = self._get_limit(key)['window']
+                with shard_lock:
+                    bucket = buckets.get(key)
+                    # A bucket idle for a whole window has refilled completely
+                    if bucket is not None and current_time - bucket[1] >= window:
+                        del buckets[key]
+                        removed += 1
+        
+        logger.debug(f"Rate limiter cleanup completed, removed {removed} keys")
     
     def get_stats(self) -> Dict:
         """Get rate limiter statistics."""
-        with self.lock:
-            total_keys = len(self.requests)
-            total_requests = sum(len(times) for times in self.requests.values())
-            
-            # Get most active clients
-            active_clients = sorted(
-                self.requests.items(),
-                key=lambda x: len(x[1]),
-                reverse=True
-            )[:10]
-            
-            return {
-                'total_clients': total_keys,
-                'total_requests': total_requests,
-                'active_clients': [
-                    {'key': key, 'request_count': len(times)}
-                    for key, times in active_clients
-                ],
-                'configured_limits': len(self.limits),
-                'timestamp': time.time()
-            }
+        current_time = time.monotonic()
+        usage = []
+        total_requests = 0
+        
+        for shard_lock, buckets in self.shards:
+            with shard_lock:
+                for key, (tokens, last_refill) in buckets.items():
+                    limit = self._get_limit(key)
+                    capacity = limit['requests']
+                    refilled = min(capacity, tokens + (current_time - last_refill) * capacity / limit['window'])
+                    # Tokens still missing from the bucket approximate recent requests
+                    count = int(capacity - refilled)
+                    usage.append((key, count))
+                    total_requests += count
+        
+        # Get most active clients
+        active_clients = heapq.nlargest(10, usage, key=lambda x: x[1])
+        
+        return {
+            'total_clients': len(usage),
+            'total_requests': total_requests,
+            'active_clients': [
+                {'key': key, 'request_count': count}
+                for key, count in active_clients
+            ],
+            'configured_limits': len(self.limits),
+            'timestamp': time.time()
+        }
 
 # Decorator for rate limiting
 def rate_limit(limit_type: str = 'default'):
@@ -168,12 +208,12 @@ def rate_limit(limit_type: str = 'default'):
                 response = jsonify({
                     'success': False,
                     'error': 'Rate limit exceeded',
-                    'retry_after': int(result['reset_time'] - time.time())
+                    'retry_after': int(result['reset_after'])
                 })
                 response.headers['X-RateLimit-Limit'] = str(result['limit'])
                 response.headers['X-RateLimit-Remaining'] = str(result['remaining'])
                 response.headers['X-RateLimit-Reset'] = str(int(result['reset_time']))
-                response.headers['Retry-After'] = str(int(result['reset_time'] - time.time()))
+                response.headers['Retry-After'] = str(int(result['reset_after']))
                 return response, 429
             
             # Add rate limit headers to response
@@ -4,49 +4,150 @@ Security Manager for Galaksio
 Provides security functionality including JWT tokens, input validation, and security headers.
 """
 
+import base64
+import json
 import logging
 import re
 import jwt
 import hashlib
+import hmac
 import secrets
-from typing import Dict, Optional, Any, List
-from datetime import datetime, timedelta
-from functools import wraps
+import threading
+import time
+from argon2 import PasswordHasher
+from argon2.exceptions import VerificationError
+from types import MappingProxyType
+from typing import Callable, Dict, Optional, Any, List, Mapping, Union
+from functools import lru_cache, wraps
 from flask import request, jsonify
 
 logger = logging.getLogger(__name__)
 
+def compile_validator(validation_rules: Dict) -> Callable[[Any], Dict]:
+    """Compile validation rules into a function that checks input data against them."""
+    namespace = {}
+    lines = ["def _validate(data):", "    errors = []"]
+    
+    def add_check(condition: str, message: str):
+        lines.append(f"        if {condition}:")
+        lines.append(f"            errors.append({message!r})")
+    
+    for index, (field, rules) in enumerate(validation_rules.items()):
+        lines.append(f"    if {field!r} not in data:")
+        if rules.get('required', False):
+            lines.append(f"        errors.append({f'{field} is required'!r})")
+        else:
+            lines.append("        pass")
+        lines.append("    else:")
+        lines.append(f"        value = data[{field!r}]")
+        
+        # Rule values are bound as globals of the generated function, never inlined
+        if 'type' in rules:
+            expected_type = rules['type']
+            namespace[f'_type_{index}'] = expected_type
+            type_name = getattr(expected_type, '__name__', repr(expected_type))
+            add_check(f"not isinstance(value, _type_{index})", f"{field} must be of type {type_name}")
+        
+        if 'min_length' in rules:
+            namespace[f'_min_length_{index}'] = rules['min_length']
+            add_check(f"len(str(value)) < _min_length_{index}",
+                      f"{field} must be at least {rules['min_length']} characters long")
+        
+        if 'max_length' in rules:
+            namespace[f'_max_length_{index}'] = rules['max_length']
+            add_check(f"len(str(value)) > _max_length_{index}",
+                      f"{field} must be at most {rules['max_length']} characters long")
+        
+        if 'min_value' in rules:
+            namespace[f'_min_value_{index}'] = rules['min_value']
+            add_check(f"value < _min_value_{index}", f"{field} must be at least {rules['min_value']}")
+        
+        if 'max_value' in rules:
+            namespace[f'_max_value_{index}'] = rules['max_value']
+            add_check(f"value > _max_value_{index}", f"{field} must be at most {rules['max_value']}")
+        
+        if 'pattern' in rules:
+            pattern = rules['pattern']
+            namespace[f'_pattern_{index}'] = re.compile(pattern) if isinstance(pattern, str) else pattern
+            add_check(f"not _pattern_{index}.match(str(value))", f"{field} format is invalid")
+        
+        if 'custom' in rules:
+            namespace[f'_custom_{index}'] = rules['custom']
+            lines.append(f"        custom_error = _custom_{index}(value)")
+            lines.append("        if custom_error:")
+            lines.append("            errors.append(custom_error)")
+    
+    lines.append("    return {'valid': not errors, 'errors': errors}")
+    exec("\n".join(lines), namespace)
+    return namespace['_validate']
+
 class SecurityManager:
     """Manages security features for Galaksio."""
     
+    # Content Security Policy
+    CSP_POLICY = "; ".join((
+        "default-src 'self'",
+        "script-src 'self' 'unsafe-inline' 'unsafe-eval'",
+        "style-src 'self' 'unsafe-inline'",
+        "img-src 'self' data: https:",
+        "font-src 'self' data:",
+        "connect-src 'self' *",
+        "frame-ancestors 'none'",
+        "form-action 'self'"
+    ))
+    
+    # Security headers for HTTP responses, shared read-only by every response
+    SECURITY_HEADERS = MappingProxyType({
+        'X-Content-Type-Options': 'nosniff',
+        'X-Frame-Options': 'DENY',
+        'X-XSS-Protection': '1; mode=block',
+        'Referrer-Policy': 'strict-origin-when-cross-origin',
+        'Permissions-Policy': 'geolocation=(), microphone=(), camera=()',
+        'Content-Security-Policy': CSP_POLICY
+    })
+    
+    # Number of decoded token payloads kept in memory
+    TOKEN_CACHE_SIZE = 1024
+    
+    # Length of a legacy "salt:sha256" password hash
+    LEGACY_HASH_LENGTH = 32 + 1 + 64
+    
+    # Translation table deleting the characters stripped by sanitize_input
+    SANITIZE_TABLE = str.maketrans('', '', '<>"\'')
+    
     def __init__(self, jwt_secret_key: str, jwt_expiration_hours: int = 24):
         self.jwt_secret_key = jwt_secret_key
         self.jwt_expiration_hours = jwt_expiration_hours
-        self.blacklisted_tokens = set()
+        # Encoder/decoder and key bytes are prepared once instead of per call
+        self._jwt = jwt.PyJWT(options={'require': ['exp', 'iat']})
+        self._jwt_key = jwt_secret_key.encode()
+        self._decode_token = lru_cache(maxsize=self.TOKEN_CACHE_SIZE)(self._decode_token_uncached)
+        self.password_hasher = PasswordHasher(time_cost=2, memory_cost=64 * 1024, parallelism=1)
+        # Revoked token IDs in two generations, rotated every token lifetime so
+        # entries expire together with the tokens they revoke
+        self.blacklisted_jtis = set()
+        self._previous_blacklisted_jtis = set()
+        self._blacklist_rotated_at = time.monotonic()
+        self._blacklist_lock = threading.Lock()
+        # Identifier -> attempt data, in order of first attempt
         self.failed_login_attempts = {}
-        self.security_headers = {
-            'X-Content-Type-Options': 'nosniff',
-            'X-Frame-Options': 'DENY',
-            'X-XSS-Protection': '1; mode=block',
-            'Referrer-Policy': 'strict-origin-when-cross-origin',
-            'Permissions-Policy': 'geolocation=(), microphone=(), camera=()',
-            'Content-Security-Policy': self._get_csp_policy()
-        }
+        self.validation_schemas: Dict[str, Callable[[Any], Dict]] = {}
     
     def generate_token(self, user_id: str, additional_claims: Optional[Dict] = None) -> str:
         """Generate JWT token."""
         try:
+            now = int(time.time())
             payload = {
                 'user_id': user_id,
-                'iat': datetime.utcnow(),
-                'exp': datetime.utcnow() + timedelta(hours=self.jwt_expiration_hours),
+                'iat': now,
+                'exp': now + self.jwt_expiration_hours * 3600,
                 'jti': secrets.token_urlsafe(16)
             }
             
             if additional_claims:
                 payload.update(additional_claims)
             
-            token = jwt.encode(payload, self.jwt_secret_key, algorithm='HS256')
+            token = self._jwt.encode(payload, self._jwt_key, algorithm='HS256')
             logger.info(f"Generated token for user {user_id}")
             return token
             
@@ -56,58 +157,103 @@ class SecurityManager:
     
     def validate_token(self, token: str) -> bool:
         """Validate JWT token."""
+        return self.get_validated_payload(token) is not None
+    
+    def get_validated_payload(self, token: str) -> Optional[Dict]:
+        """Get the payload of a valid, non-blacklisted JWT token, or None."""
         try:
-            # Check if token is blacklisted
-            if token in self.blacklisted_tokens:
-                logger.warning("Attempted to use blacklisted token")
-                return False
-            
             # Decode and validate token
-            payload = jwt.decode(token, self.jwt_secret_key, algorithms=['HS256'])
+            payload = self._get_valid_payload(token)
             
-            # Check expiration
-            if datetime.utcnow() > datetime.fromtimestamp(payload['exp']):
-                logger.warning("Token expired")
-                return False
+            # Check if token is blacklisted
+            if self._is_blacklisted(payload.get('jti')):
+                logger.warning("Attempted to use blacklisted token")
+                return None
             
             logger.debug(f"Token validated for user {payload.get('user_id')}")
-            return True
+            return payload
             
         except jwt.ExpiredSignatureError:
             logger.warning("Token expired")
-            return False
+            return None
         except jwt.InvalidTokenError as e:
             logger.warning(f"Invalid token: {e}")
-            return False
+            return None
         except Exception as e:
             logger.error(f"Error validating token: {e}")
-            return False
+            return None
     
     def blacklist_token(self, token: str) -> bool:
         """Add token to blacklist."""
         try:
-            self.blacklisted_tokens.add(token)
+            jti = self._decode_token(token).get('jti')
+            if jti is None:
+                logger.warning("Cannot blacklist a token without a jti claim")
+                return False
+            
+            with self._blacklist_lock:
+                self._rotate_blacklist()
+                self.blacklisted_jtis.add(jti)
             logger.info("Token blacklisted")
             return True
-        except Exception as e:
-            logger.error(f"Error blacklisting token: {e}")
+        except jwt.ExpiredSignatureError:
+            # Expired tokens are rejected anyway
+            return True
+        except jwt.InvalidTokenError as e:
+            logger.warning(f"Cannot blacklist invalid token: {e}")
             return False
     
+    def _is_blacklisted(self, jti: Optional[str]) -> bool:
+        """Check if a token ID has been blacklisted."""
+        with self._blacklist_lock:
+            self._rotate_blacklist()
+            return jti in self.blacklisted_jtis or jti in self._previous_blacklisted_jtis
+    
+    def _rotate_blacklist(self):
+        """Drop the older blacklist generation once a full token lifetime has passed."""
+        current_time = time.monotonic()
+        if current_time - self._blacklist_rotated_at >= self.jwt_expiration_hours * 3600:
+            self._previous_blacklisted_jtis = self.blacklisted_jtis
+            self.blacklisted_jtis = set()
+            self._blacklist_rotated_at = current_time
+    
     def get_token_payload(self, token: str) -> Optional[Dict]:
         """Get payload from JWT token."""
         try:
-            payload = jwt.decode(token, self.jwt_secret_key, algorithms=['HS256'])
-            return payload
-        except Exception as e:
-            logger.error(f"Error getting token payload: {e}")
+            return self._get_valid_payload(token)
+        except jwt.InvalidTokenError as e:
+            logger.warning(f"Cannot get payload of invalid token: {e}")
             return None
     
+    def _decode_token_uncached(self, token: str) -> Dict:
+        """Decode and verify a JWT token, rejecting expired tokens before checking the signature."""
+        # Expired tokens are the common rejection, so read exp from the unverified
+        # payload first; a forged exp can only get its own token rejected
+        try:
+            payload_segment = token.split('.', 2)[1]
+            claims = json.loads(base64.urlsafe_b64decode(payload_segment + '=' * (-len(payload_segment) % 4)))
+            expired = claims['exp'] <= time.time()
+        except Exception:
+            # Malformed tokens are reported by the full decode below
+            expired = False
+        if expired:
+            raise jwt.ExpiredSignatureError("Signature has expired")
+        
+        return self._jwt.decode(token, self._jwt_key, algorithms=['HS256'])
+    
+    def _get_valid_payload(self, token: str) -> Dict:
+        """Get the payload of a verified token, raising if it has expired."""
+        payload = self._decode_token(token)
+        
+        # Cached payloads skip PyJWT's own expiration check
+        if payload['exp'] <= time.time():
+            raise jwt.ExpiredSignatureError("Signature has expired")
+        return payload
+    
     def hash_password(self, password: str) -> str:
-        """Hash password using SHA-256 with salt."""
+        """Hash password using Argon2id."""
         try:
-            salt = secrets.token_hex(16)
-            password_hash = hashlib.sha256((password + salt).encode()).hexdigest()
-            return f"{salt}:{password_hash}"
+            return self.password_hasher.hash(password)
         except Exception as e:
             logger.error(f"Error hashing password: {e}")
             raise
@@ -115,15 +261,44 @@ class SecurityManager:
     def verify_password(self, password: str, hashed_password: str) -> bool:
         """Verify password against hash."""
         try:
-            salt, password_hash = hashed_password.split(':')
-            computed_hash = hashlib.sha256((password + salt).encode()).hexdigest()
-            return computed_hash == password_hash
+            if not hashed_password.startswith('$argon2'):
+                return self._verify_legacy_password(password, hashed_password)
+            return self.password_hasher.verify(hashed_password, password)
+        except VerificationError:
+            return False
         except Exception as e:
             logger.error(f"Error verifying password: {e}")
             return False
     
-    def validate_input(self, input_data: Any, validation_rules: Dict) -> Dict:
-        """Validate input data against rules."""
+    def password_needs_rehash(self, hashed_password: str) -> bool:
+        """Check if a stored hash should be replaced by hash_password after a successful login."""
+        if not hashed_password.startswith('$argon2'):
+            return True
+        return self.password_hasher.check_needs_rehash(hashed_password)
+    
+    def _verify_legacy_password(self, password: str, hashed_password: str) -> bool:
+        """Verify password against a legacy salted SHA-256 hash."""
+        # Legacy hashes are "<32 hex salt>:<64 hex digest>"
+        if len(hashed_password) != self.LEGACY_HASH_LENGTH or hashed_password[32] != ':':
+            return False
+        
+        salt = hashed_password[:32]
+        computed_hash = hashlib.sha256((password + salt).encode()).hexdigest()
+        return hmac.compare_digest(computed_hash, hashed_password[33:])
+    
+    def register_schema(self, name: str, validation_rules: Dict) -> Callable[[Any], Dict]:
+        """Register validation rules under a name as a compiled validator."""
+        validator = compile_validator(validation_rules)
+        self.validation_schemas[name] = validator
+        return validator
+    
+    def validate_input(self, input_data: Any, validation_rules: Union[Dict, str]) -> Dict:
+        """Validate input data against rules or the name of a registered schema."""
+        if isinstance(validation_rules, str):
+            return self.validation_schemas[validation_rules](input_data)
+        
+        # Ad-hoc rules are checked directly; compiling them would cost more than
+        # a single validation, so only registered schemas are compiled
         errors = []
         
         for field, rules in validation_rules.items():
@@ -138,7 +313,8 @@ class SecurityManager:
             if 'type' in rules:
                 expected_type = rules['type']
                 if not isinstance(value, expected_type):
-                    errors.append(f"{field} must be of type {expected_type.__name__}")
+                    type_name = getattr(expected_type, '__name__', repr(expected_type))
+                    errors.append(f"{field} must be of type {type_name}")
             
             # Length validation
             if 'min_length' in rules and len(str(value)) < rules['min_length']:
@@ -166,16 +342,20 @@ class SecurityManager:
                     errors.append(custom_error)
         
         return {
-            'valid': len(errors) == 0,
+            'valid': not errors,
             'errors': errors
         }
     
     def sanitize_input(self, input_data: Any) -> Any:
         """Sanitize input data to prevent XSS and injection attacks."""
         if isinstance(input_data, str):
+            # Most strings contain none of the characters, so skip the copy for them
+            if ('<' not in input_data and '>' not in input_data
+                    and '"' not in input_data and "'" not in input_data):
+                return input_data
+            
             # Remove potentially dangerous characters
-            sanitized = re.sub(r'[<>"\']', '', input_data)
-            return sanitized
+            return input_data.translate(self.SANITIZE_TABLE)
         elif isinstance(input_data, dict):
             return {key: self.sanitize_input(value) for key, value in input_data.items()}
         elif isinstance(input_data, list):
@@ -185,103 +365,84 @@ class SecurityManager:
     
     def log_failed_attempt(self, identifier: str) -> bool:
         """Log failed login attempt."""
-        try:
-            if identifier not in self.failed_login_attempts:
-                self.failed_login_attempts[identifier] = {
-                    'attempts': 0,
-                    'first_attempt': datetime.utcnow(),
-                    'locked_until': None
-                }
-            
-            attempt_data = self.failed_login_attempts[identifier]
-            attempt_data['attempts'] += 1
-            
-            # Lock account after too many attempts
-            if attempt_data['attempts'] >= 5:
-                lock_duration = timedelta(minutes=30)
-                attempt_data['locked_until'] = datetime.utcnow() + lock_duration
-                logger.warning(f"Account {identifier} locked due to too many failed attempts")
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error logging failed attempt: {e}")
-            return False
+        attempt_data = self.failed_login_attempts.get(identifier)
+        if attempt_data is None:
+            attempt_data = self.failed_login_attempts.setdefault(identifier, {
+                'attempts': 0,
+                'first_attempt': time.time(),
+                'locked_until': None
+            })
+        
+        attempt_data['attempts'] += 1
+        
+        # Lock account after too many attempts
+        if attempt_data['attempts'] >= 5:
+            lock_duration = 30 * 60
+            attempt_data['locked_until'] = time.time() + lock_duration
+            logger.warning(f"Account {identifier} locked due to too many failed attempts")
+        
+        return True
     
     def is_account_locked(self, identifier: str) -> bool:
         """Check if account is locked."""
-        try:
-            if identifier not in self.failed_login_attempts:
-                return False
-            
-            attempt_data = self.failed_login_attempts[identifier]
-            if attempt_data['locked_until']:
-                if datetime.utcnow() < attempt_data['locked_until']:
-                    return True
-                else:
-                    # Reset after lock period
-                    del self.failed_login_attempts[identifier]
-            
-            return False
-            
-        except Exception as e:
-            logger.error(f"Error checking account lock: {e}")
+        attempt_data = self.failed_login_attempts.get(identifier)
+        if attempt_data is None or not attempt_data['locked_until']:
             return False
+        
+        if time.time() < attempt_data['locked_until']:
+            return True
+        
+        # Reset after lock period
+        self.failed_login_attempts.pop(identifier, None)
+        return False
     
-    def get_security_headers(self) -> Dict[str, str]:
+    def get_security_headers(self) -> Mapping[str, str]:
         """Get security headers for HTTP responses."""
-        return self.security_headers.copy()
-    
-    def _get_csp_policy(self) -> str:
-        """Get Content Security Policy."""
-        return "; ".join([
-            "default-src 'self'",
-            "script-src 'self' 'unsafe-inline' 'unsafe-eval'",
-            "style-src 'self' 'unsafe-inline'",
-            "img-src 'self' data: https:",
-            "font-src 'self' data:",
-            "connect-src 'self' *",
-            "frame-ancestors 'none'",
-            "form-action 'self'"
-        ])
+        return self.SECURITY_HEADERS
     
     def cleanup_expired_data(self):
         """Clean up expired security data."""
         try:
-            # Clean up old failed login attempts
-            current_time = datetime.utcnow()
+            # Clean up old failed login attempts. Entries are only ever inserted
+            # with first_attempt set to the current time, so the dict is ordered
+            # by first attempt and the scan stops at the first live entry.
+            expiry_time = time.time() - 24 * 3600
             expired_identifiers = []
             
             for identifier, attempt_data in self.failed_login_attempts.items():
-                if (current_time - attempt_data['first_attempt']) > timedelta(hours=24):
-                    expired_identifiers.append(identifier)
+                if attempt_data['first_attempt'] >= expiry_time:
+                    break
+                expired_identifiers.append(identifier)
             
             for identifier in expired_identifiers:
                 del self.failed_login_attempts[identifier]
             
             # Clean up blacklisted tokens (older than expiration)
-            # This would require storing token creation times
+            with self._blacklist_lock:
+                self._rotate_blacklist()
             
             logger.debug("Security data cleanup completed")
             
         except Exception as e:
             logger.error(f"Error in security data cleanup: {e}")
 
+def _extract_and_validate(token_header: str) -> Optional[Dict]:
+    """Get the validated payload of the bearer token in an Authorization header."""
+    return security_manager.get_validated_payload(token_header.removeprefix('Bearer ').strip())
+
 # Decorator for requiring authentication
 def require_auth(f):
     """Decorator to require authentication."""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token:
+        token_header = request.headers.get('Authorization')
+        if not token_header:
             return jsonify({'success': False, 'error': 'Authorization token required'}), 401
         
-        if not token.startswith('Bearer '):
+        if not token_header.startswith('Bearer '):
             return jsonify({'success': False, 'error': 'Invalid token format'}), 401
         
-        token = token[7:]  # Remove 'Bearer ' prefix
-        
-        if not security_manager.validate_token(token):
+        if _extract_and_validate(token_header) is None:
             return jsonify({'success': False, 'error': 'Invalid or expired token'}), 401
         
         return f(*args, **kwargs)
@@ -292,17 +453,16 @@ def require_admin(f):
     """Decorator to require admin role."""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        token = request.headers.get('Authorization')
-        if not token or not token.startswith('Bearer '):
+        token_header = request.headers.get('Authorization')
+        if not token_header or not token_header.startswith('Bearer '):
             return jsonify({'success': False, 'error': 'Authorization token required'}), 401
         
-        token = token[7:]
-        
-        if not security_manager.validate_token(token):
+        # One decode serves both the validity and the admin check
+        payload = _extract_and_validate(token_header)
+        if payload is None:
             return jsonify({'success': False, 'error': 'Invalid or expired token'}), 401
         
-        payload = security_manager.get_token_payload(token)
-        if not payload or not payload.get('is_admin', False):
+        if not payload.get('is_admin', False):
             return jsonify({'success': False, 'error': 'Admin access required'}), 403
         
         return f(*args, **kwargs)
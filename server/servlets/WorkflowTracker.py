@@ -4,125 +4,451 @@ Enhanced Workflow Tracker for Galaxy 25.0
 Provides real-time workflow execution state tracking.
 """
 
+import heapq
 import logging
+import queue
 import time
 import threading
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
 from bioblend.galaxy import GalaxyInstance
 
+from .GalaxyAPIVerifier import TERMINAL_INVOCATION_STATES, enable_connection_pooling
+
 logger = logging.getLogger(__name__)
 
+# Workflow and step states after which Galaxy no longer updates them
+TERMINAL_STATES = frozenset(('ok', 'error', 'deleted'))
+
+# Tracked workflow states that end tracking: terminal workflow states or the
+# terminal states of the invocations Galaxy reports
+FINISHED_STATES = TERMINAL_STATES | TERMINAL_INVOCATION_STATES
+
+# Finished states reported as failed executions
+FAILED_STATES = frozenset(('error', 'failed'))
+
 class WorkflowTracker:
     """Enhanced workflow execution tracker."""
     
+    # Number of independently locked partitions of the tracked workflows
+    SHARD_COUNT = 16
+    # Finished workflows are evicted, least recently updated first, once a
+    # shard holds more than its share of this many workflows
+    MAX_TRACKED_WORKFLOWS = 10000
+    # Seconds between automatic cleanups of old finished workflows
+    CLEANUP_INTERVAL = 300
+    
     def __init__(self, galaxy_instance: GalaxyInstance):
+        # Polls reuse keep-alive connections instead of reconnecting every cycle
+        enable_connection_pooling(galaxy_instance)
         self.gi = galaxy_instance
-        self.active_workflows = {}
+        # Tracked workflows are partitioned by invocation ID, each shard holding
+        # its own lock and invocation ID -> tracking information dict;
+        # timestamps are time.monotonic() values. Shard locks guard adding,
+        # removing and reordering workflows; each workflow's fields are guarded
+        # by its own '_lock', always taken after the shard lock when both are
+        # needed. Shards are ordered from least to most recently updated.
+        self.shards: List[Tuple[threading.Lock, OrderedDict]] = [
+            (threading.Lock(), OrderedDict()) for _ in range(self.SHARD_COUNT)
+        ]
+        # Read-only copy of each shard for readers, replaced as a whole under
+        # the shard lock after every change so reads need no lock; only the
+        # entries of changed workflows are copied anew.
+        self._snapshots: List[Dict[str, Dict]] = [{} for _ in range(self.SHARD_COUNT)]
+        # Guards starting the tracking thread so it is started only once
         self.lock = threading.Lock()
         self.tracking_thread = None
         self.running = False
         self.max_retries = 3
         self.retry_delay = 1
+        # Each workflow is polled every min_poll_interval seconds while it
+        # changes, backing off to max_poll_interval while it stays unchanged
+        self.min_poll_interval = 1.0
+        self.max_poll_interval = 60.0
+        # Min-heap of (next poll time, invocation ID); entries whose time no
+        # longer matches the workflow's '_next_poll_at' are stale and skipped
+        self._schedule: List[Tuple[float, str]] = []
+        self._schedule_lock = threading.Lock()
+        # Workers for invocations polled individually
+        self.executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='workflow-tracker')
+        # Number of tracked workflows in each state, kept up to date on every
+        # state change so statistics need no scan
+        self._state_counts: Counter = Counter()
+        self._state_counts_lock = threading.Lock()
+        # Invocation IDs to refresh ahead of the next full poll
+        self._pending_updates: queue.Queue = queue.Queue()
+        # Invocation ID -> callbacks receiving the workflow status on every change
+        self._listeners: Dict[str, List[Callable[[Dict], None]]] = defaultdict(list)
+        self._listeners_lock = threading.Lock()
+        # Listeners run on their own worker so a slow one cannot delay polling;
+        # a single worker delivers each workflow's changes in order
+        self._listener_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='workflow-listener')
     
-    def start_tracking(self, workflow_id: str, invocation_id: str):
-        """Start tracking a workflow execution."""
-        with self.lock:
-            self.active_workflows[invocation_id] = {
+    def start_tracking(self, workflow_id: str, invocation_id: str, history_id: Optional[str] = None):
+        """Start tracking a workflow execution, optionally with the ID of the history it runs in."""
+        current_time = time.monotonic()
+        shard_index = self._get_shard_index(invocation_id)
+        shard_lock, workflows = self.shards[shard_index]
+        with shard_lock:
+            previous_info = workflows.get(invocation_id)
+            self._count_state_change(previous_info['state'] if previous_info else None, 'running')
+            workflows[invocation_id] = {
                 'workflow_id': workflow_id,
                 'invocation_id': invocation_id,
-                'start_time': datetime.now(),
-                'last_update': datetime.now(),
+                'history_id': history_id,
+                'start_time': current_time,
+                'last_update': current_time,
                 'state': 'running',
                 'steps': {},
                 'progress': 0.0,
-                'errors': [],
-                'retry_count': 0
+                # Used as an ordered set so each error is reported once
+                'errors': {},
+                'retry_count': 0,
+                '_lock': threading.Lock(),
+                '_poll_interval': self.min_poll_interval,
+                '_next_poll_at': current_time
             }
+            evicted = []
+            if len(workflows) > self.MAX_TRACKED_WORKFLOWS // self.SHARD_COUNT:
+                evicted = self._evict_finished_workflows(workflows)
+            self._publish_snapshot(shard_index, [invocation_id, *evicted])
         
-        if not self.running:
-            self._start_background_tracking()
+        with self._schedule_lock:
+            heapq.heappush(self._schedule, (current_time, invocation_id))
+        
+        # Fetch the first state right away rather than at the next full poll
+        self.request_update(invocation_id)
+        with self.lock:
+            if not self.running:
+                self._start_background_tracking()
+    
+    def set_poll_bounds(self, min_interval: float, max_interval: float):
+        """Set the shortest and longest interval in seconds between polls of a workflow."""
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError("Poll intervals must satisfy 0 < min_interval <= max_interval")
+        self.min_poll_interval = min_interval
+        self.max_poll_interval = max_interval
+    
+    def on_change(self, invocation_id: str, callback: Callable[[Dict], None]):
+        """Call back with the workflow status whenever its state, steps or progress change."""
+        with self._listeners_lock:
+            self._listeners[invocation_id].append(callback)
+    
+    def request_update(self, invocation_id: str):
+        """Ask the tracking thread to refresh a workflow without waiting for the next poll."""
+        self._pending_updates.put(invocation_id)
     
     def stop_tracking(self, invocation_id: str):
         """Stop tracking a workflow execution."""
-        with self.lock:
-            if invocation_id in self.active_workflows:
-                self.active_workflows[invocation_id]['state'] = 'completed'
-                self.active_workflows[invocation_id]['end_time'] = datetime.now()
+        workflow_info = self._get_workflow_info(invocation_id)
+        if workflow_info is None:
+            return
+        
+        with workflow_info['_lock']:
+            self._count_state_change(workflow_info['state'], 'completed')
+            workflow_info['state'] = 'completed'
+            workflow_info['end_time'] = time.monotonic()
+            self._notify_listeners(invocation_id, workflow_info)
+        
+        shard_index = self._get_shard_index(invocation_id)
+        with self.shards[shard_index][0]:
+            self._publish_snapshot(shard_index, [invocation_id])
     
     def get_workflow_status(self, invocation_id: str) -> Optional[Dict]:
         """Get current status of a workflow execution."""
-        with self.lock:
-            return self.active_workflows.get(invocation_id)
+        return self._snapshots[self._get_shard_index(invocation_id)].get(invocation_id)
     
     def get_all_active_workflows(self) -> List[Dict]:
         """Get all active workflow executions."""
-        with self.lock:
-            return list(self.active_workflows.values())
+        return [workflow_info for snapshot in self._snapshots for workflow_info in snapshot.values()]
+    
+    def _get_shard_index(self, invocation_id: str) -> int:
+        """Get the index of the shard holding an invocation."""
+        return hash(invocation_id) % self.SHARD_COUNT
+    
+    def _evict_finished_workflows(self, workflows: OrderedDict) -> List[str]:
+        """Evict the least recently updated finished workflows of a full shard; call with the shard lock held.
+        
+        Returns the IDs of the evicted invocations.
+        """
+        excess = len(workflows) - self.MAX_TRACKED_WORKFLOWS // self.SHARD_COUNT
+        finished = [
+            invocation_id for invocation_id, workflow_info in workflows.items()
+            if workflow_info.get('end_time') is not None
+        ]
+        for invocation_id in finished[:excess]:
+            self._count_state_change(workflows.pop(invocation_id)['state'], None)
+            self._drop_listeners(invocation_id)
+            logger.info(f"Evicted finished workflow: {invocation_id}")
+        return finished[:excess]
+    
+    def _get_workflow_info(self, invocation_id: str) -> Optional[Dict]:
+        """Get the tracking information of a workflow, or None if it is not tracked."""
+        shard_lock, workflows = self.shards[self._get_shard_index(invocation_id)]
+        with shard_lock:
+            return workflows.get(invocation_id)
+    
+    def _publish_snapshot(self, shard_index: int, invocation_ids):
+        """Publish a copy of a shard for lock-free readers; call with the shard lock held.
+        
+        Only the given invocations, which were changed, added or removed, are copied anew.
+        """
+        # Offset converting monotonic timestamps to wall-clock time
+        wall_clock_offset = time.time() - time.monotonic()
+        workflows = self.shards[shard_index][1]
+        snapshot = dict(self._snapshots[shard_index])
+        for invocation_id in invocation_ids:
+            workflow_info = workflows.get(invocation_id)
+            if workflow_info is None:
+                snapshot.pop(invocation_id, None)
+                continue
+            with workflow_info['_lock']:
+                snapshot[invocation_id] = self._public_copy(workflow_info, wall_clock_offset)
+        self._snapshots[shard_index] = snapshot
+    
+    @staticmethod
+    def _public_copy(workflow_info: Dict, wall_clock_offset: float) -> Dict:
+        """Copy workflow information for readers, leaving out internal '_' fields."""
+        public_info = {key: value for key, value in workflow_info.items() if not key.startswith('_')}
+        # Step dicts are updated in place, so readers get their own copies
+        public_info['steps'] = {step_id: dict(step_info) for step_id, step_info in workflow_info['steps'].items()}
+        public_info['errors'] = list(workflow_info['errors'])
+        
+        # Timestamps are kept on the monotonic clock and only converted here
+        for key in ('start_time', 'last_update', 'end_time'):
+            if public_info.get(key) is not None:
+                public_info[key] = datetime.fromtimestamp(public_info[key] + wall_clock_offset).isoformat()
+        return public_info
     
     def _start_background_tracking(self):
-        """Start background thread for tracking workflow states."""
+        """Start background thread for tracking workflow states; call with the lock held."""
         self.running = True
         self.tracking_thread = threading.Thread(target=self._tracking_loop, daemon=True)
         self.tracking_thread.start()
     
     def _tracking_loop(self):
         """Background loop for updating workflow states."""
+        next_cleanup = time.monotonic() + self.CLEANUP_INTERVAL
         while self.running:
             try:
+                # Serve update requests while waiting for the next scheduled poll
+                timeout = self._seconds_until_next_poll()
+                if timeout > 0:
+                    try:
+                        invocation_id = self._pending_updates.get(timeout=timeout)
+                    except queue.Empty:
+                        pass
+                    else:
+                        self._update_requested_workflows(invocation_id)
+                        continue
+                
                 self._update_workflow_states()
-                time.sleep(5)  # Update every 5 seconds
+                
+                if time.monotonic() >= next_cleanup:
+                    self.cleanup_old_workflows()
+                    next_cleanup = time.monotonic() + self.CLEANUP_INTERVAL
             except Exception as e:
                 logger.error(f"Error in tracking loop: {e}")
                 time.sleep(10)  # Wait longer on error
     
+    def _seconds_until_next_poll(self) -> float:
+        """Get the time until the earliest scheduled poll, waking at least every max_poll_interval."""
+        with self._schedule_lock:
+            if not self._schedule:
+                return self.max_poll_interval
+            return min(self._schedule[0][0] - time.monotonic(), self.max_poll_interval)
+    
+    def _update_requested_workflows(self, invocation_id: str):
+        """Update a requested workflow along with any other pending requests."""
+        requested = {invocation_id}
+        while True:
+            try:
+                requested.add(self._pending_updates.get_nowait())
+            except queue.Empty:
+                break
+        
+        self._update_individually(requested, time.monotonic())
+        self._publish_snapshots(requested)
+    
     def _update_workflow_states(self):
-        """Update states of all active workflows."""
-        with self.lock:
-            active_invocations = list(self.active_workflows.keys())
+        """Update states of the active workflows that are due for a poll."""
+        current_time = time.monotonic()
+        due = []
+        with self._schedule_lock:
+            while self._schedule and self._schedule[0][0] <= current_time:
+                due.append(heapq.heappop(self._schedule))
+        
+        # Finished workflows no longer change, so they are never polled
+        active_invocations = []
+        for next_poll_at, invocation_id in due:
+            workflow_info = self._get_workflow_info(invocation_id)
+            if (workflow_info is not None and workflow_info.get('end_time') is None
+                    and workflow_info['_next_poll_at'] == next_poll_at):
+                active_invocations.append(invocation_id)
         
+        if not active_invocations:
+            return
+        
+        # Fetch all non-terminal invocations in one request. Invocations missing
+        # from it have usually just finished; those sharing a history with
+        # others are fetched with one listing of the history, terminal ones
+        # included, and the rest individually
+        invocations_by_id = self._get_active_invocations()
+        finished_invocations = [
+            invocation_id for invocation_id in active_invocations if invocation_id not in invocations_by_id
+        ]
+        if finished_invocations:
+            invocations_by_id.update(self._get_history_invocations(finished_invocations))
+        
+        missing_invocations = []
         for invocation_id in active_invocations:
+            invocation = invocations_by_id.get(invocation_id)
+            if invocation is None:
+                missing_invocations.append(invocation_id)
+                continue
             try:
-                self._update_single_workflow(invocation_id)
+                self._update_single_workflow(invocation_id, invocation, current_time)
             except Exception as e:
                 logger.error(f"Error updating workflow {invocation_id}: {e}")
+        
+        if missing_invocations:
+            self._update_individually(missing_invocations, current_time)
+        
+        # Publish the whole batch of updates at once
+        self._publish_snapshots(active_invocations)
+    
+    def _update_individually(self, invocation_ids, now: float):
+        """Fetch and update workflows one invocation at a time."""
+        # Poll concurrently so this waits for the slowest request rather than
+        # the sum of all of them
+        futures = {
+            self.executor.submit(self._update_single_workflow, invocation_id, None, now): invocation_id
+            for invocation_id in invocation_ids
+        }
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Error updating workflow {futures[future]}: {e}")
+    
+    def _publish_snapshots(self, invocation_ids):
+        """Publish the given changed invocations to the snapshots of their shards, one shard at a time."""
+        ids_by_shard = defaultdict(list)
+        for invocation_id in invocation_ids:
+            ids_by_shard[self._get_shard_index(invocation_id)].append(invocation_id)
+        
+        for shard_index, shard_invocation_ids in ids_by_shard.items():
+            with self.shards[shard_index][0]:
+                self._publish_snapshot(shard_index, shard_invocation_ids)
     
-    def _update_single_workflow(self, invocation_id: str):
-        """Update state of a single workflow execution."""
+    def _get_active_invocations(self) -> Dict[str, Dict]:
+        """Get details of all non-terminal invocations, keyed by invocation ID."""
         try:
+            invocations = self.gi.invocations.get_invocations(
+                include_terminal=False, view='element', step_details=True
+            )
+            return {invocation['id']: invocation for invocation in invocations}
+        except Exception as e:
+            logger.warning(f"Batch invocation fetch failed, polling individually: {e}")
+            return {}
+    
+    def _get_history_invocations(self, invocation_ids: List[str]) -> Dict[str, Dict]:
+        """Get details of all invocations in the histories holding several of the given invocations, keyed by invocation ID."""
+        due_per_history = Counter()
+        for invocation_id in invocation_ids:
+            workflow_info = self._get_workflow_info(invocation_id)
+            if workflow_info is not None and workflow_info['history_id']:
+                due_per_history[workflow_info['history_id']] += 1
+        
+        # Listing a history only pays off over fetching its due invocations one by one
+        history_ids = [history_id for history_id, due_count in due_per_history.items() if due_count > 1]
+        
+        # Each history is fetched concurrently with one request
+        futures = [
+            (history_id, self.executor.submit(
+                self.gi.invocations.get_invocations, history_id=history_id,
+                include_terminal=True, view='element', step_details=True
+            ))
+            for history_id in history_ids
+        ]
+        invocations_by_id = {}
+        for history_id, future in futures:
+            try:
+                for invocation in future.result():
+                    invocations_by_id[invocation['id']] = invocation
+            except Exception as e:
+                logger.warning(f"Batch invocation fetch for history {history_id} failed, polling individually: {e}")
+        return invocations_by_id
+    
+    def _update_single_workflow(self, invocation_id: str, invocation: Optional[Dict] = None,
+                                now: Optional[float] = None):
+        """Update state of a single workflow execution.
+        
+        now is the monotonic time of the polling cycle, shared by all workflows it updates.
+        """
+        if now is None:
+            now = time.monotonic()
+        try:
+            workflow_info = self._get_workflow_info(invocation_id)
+            if workflow_info is None or workflow_info.get('end_time') is not None:
+                return
+            
             # Get invocation details from Galaxy with retry logic
-            invocation = self._get_invocation_with_retry(invocation_id)
+            if invocation is None:
+                invocation = self._get_invocation_with_retry(invocation_id)
             if not invocation:
+                with workflow_info['_lock']:
+                    self._schedule_next_poll(workflow_info, False, now)
                 return
             
             workflow_state = invocation.get('state', 'unknown')
             
-            with self.lock:
-                if invocation_id in self.active_workflows:
-                    workflow_info = self.active_workflows[invocation_id]
-                    workflow_info['state'] = workflow_state
-                    workflow_info['last_update'] = datetime.now()
-                    workflow_info['retry_count'] = 0  # Reset retry count on success
-                    
-                    # Update step information
-                    steps = invocation.get('steps', [])
-                    workflow_info['steps'] = self._process_steps(steps)
-                    
-                    # Calculate progress
-                    workflow_info['progress'] = self._calculate_progress(steps)
-                    
-                    # Check for errors
-                    self._check_for_errors(steps, workflow_info)
-                    
-                    # Stop tracking if completed
-                    if workflow_state in ['ok', 'error', 'deleted']:
-                        workflow_info['end_time'] = datetime.now()
-                        if workflow_state == 'error':
-                            workflow_info['errors'].append("Workflow execution failed")
+            with workflow_info['_lock']:
+                # Learn the history so later polls can batch this invocation
+                if not workflow_info['history_id']:
+                    workflow_info['history_id'] = invocation.get('history_id')
+                changed = workflow_info['state'] != workflow_state
+                if changed:
+                    self._count_state_change(workflow_info['state'], workflow_state)
+                workflow_info['state'] = workflow_state
+                workflow_info['last_update'] = now
+                workflow_info['retry_count'] = 0  # Reset retry count on success
+                
+                # Update step information, progress and step errors, unless
+                # Galaxy reports the same steps as on the previous poll
+                steps = invocation.get('steps', [])
+                steps_signature = tuple(
+                    (step.get('id'), step.get('state'), step.get('update_time'),
+                     step.get('job_id'), step.get('workflow_step_label'))
+                    for step in steps
+                )
+                if steps_signature != workflow_info.get('_steps_sig'):
+                    workflow_info['_steps_sig'] = steps_signature
+                    if self._ingest_steps(steps, workflow_info):
+                        changed = True
+                self._schedule_next_poll(workflow_info, changed, now)
+                
+                # Stop tracking if completed
+                if workflow_state in FINISHED_STATES:
+                    workflow_info.pop('_steps_sig', None)
+                    workflow_info['end_time'] = workflow_info['last_update']
+                    if workflow_state in FAILED_STATES:
+                        workflow_info['errors'].setdefault("Workflow execution failed")
+                
+                if changed:
+                    self._notify_listeners(invocation_id, workflow_info)
+            
+            # Keep shards ordered by last update for eviction
+            shard_lock, workflows = self.shards[self._get_shard_index(invocation_id)]
+            with shard_lock:
+                if invocation_id in workflows:
+                    workflows.move_to_end(invocation_id)
         
         except Exception as e:
             logger.error(f"Error updating workflow {invocation_id}: {e}")
-            self._handle_update_error(invocation_id, e)
+            self._handle_update_error(invocation_id, e, now)
     
     def _get_invocation_with_retry(self, invocation_id: str) -> Optional[Dict]:
         """Get invocation details with retry logic."""
@@ -139,95 +465,159 @@ class WorkflowTracker:
                     raise
         return None
     
-    def _handle_update_error(self, invocation_id: str, error: Exception):
+    def _handle_update_error(self, invocation_id: str, error: Exception, now: float):
         """Handle errors in workflow update."""
-        with self.lock:
-            if invocation_id in self.active_workflows:
-                workflow_info = self.active_workflows[invocation_id]
-                workflow_info['retry_count'] += 1
-                
-                if workflow_info['retry_count'] >= self.max_retries:
-                    workflow_info['state'] = 'error'
-                    workflow_info['end_time'] = datetime.now()
-                    workflow_info['errors'].append(f"Failed to update workflow status: {str(error)}")
+        workflow_info = self._get_workflow_info(invocation_id)
+        if workflow_info is None:
+            return
+        
+        with workflow_info['_lock']:
+            workflow_info['retry_count'] += 1
+            self._schedule_next_poll(workflow_info, False, now)
+            
+            if workflow_info['retry_count'] >= self.max_retries:
+                self._count_state_change(workflow_info['state'], 'error')
+                workflow_info['state'] = 'error'
+                workflow_info['end_time'] = now
+                workflow_info['errors'].setdefault(f"Failed to update workflow status: {str(error)}")
+                self._notify_listeners(invocation_id, workflow_info)
+    
+    def _count_state_change(self, old_state: Optional[str], new_state: Optional[str]):
+        """Move a workflow between state counts; None stands for not tracked."""
+        with self._state_counts_lock:
+            if old_state is not None:
+                self._state_counts[old_state] -= 1
+            if new_state is not None:
+                self._state_counts[new_state] += 1
     
-    def _process_steps(self, steps: List[Dict]) -> Dict:
-        """Process workflow steps and return structured information."""
-        processed_steps = {}
+    def _notify_listeners(self, invocation_id: str, workflow_info: Dict):
+        """Hand the current workflow status to its listeners; call with the workflow lock held."""
+        with self._listeners_lock:
+            listeners = list(self._listeners.get(invocation_id, ()))
+        if not listeners:
+            return
         
-        for step in steps:
-            step_id = step.get('id')
-            if step_id:
-                processed_steps[step_id] = {
-                    'id': step_id,
-                    'name': step.get('workflow_step_label', step.get('id')),
-                    'state': step.get('state', 'unknown'),
-                    'job_id': step.get('job_id'),
-                    'start_time': step.get('update_time'),
-                    'end_time': None,
-                    'error': None
-                }
-        
-        return processed_steps
-    
-    def _calculate_progress(self, steps: List[Dict]) -> float:
-        """Calculate workflow progress percentage."""
-        if not steps:
-            return 0.0
+        status = self._public_copy(workflow_info, time.time() - time.monotonic())
+        for callback in listeners:
+            self._listener_executor.submit(self._call_listener, callback, status)
+    
+    @staticmethod
+    def _call_listener(callback: Callable[[Dict], None], status: Dict):
+        """Run a change listener, logging rather than propagating its errors."""
+        try:
+            callback(status)
+        except Exception as e:
+            logger.error(f"Error in workflow change listener for {status['invocation_id']}: {e}")
+    
+    def _drop_listeners(self, invocation_id: str):
+        """Forget the change listeners of a workflow that is no longer tracked."""
+        with self._listeners_lock:
+            self._listeners.pop(invocation_id, None)
+    
+    def _schedule_next_poll(self, workflow_info: Dict, changed: bool, now: float):
+        """Poll changing workflows often and back off while they stay unchanged."""
+        if changed:
+            interval = self.min_poll_interval
+        else:
+            interval = max(self.min_poll_interval, min(workflow_info['_poll_interval'] * 2, self.max_poll_interval))
+        workflow_info['_poll_interval'] = interval
+        workflow_info['_next_poll_at'] = now + interval
+        with self._schedule_lock:
+            heapq.heappush(self._schedule, (now + interval, workflow_info['invocation_id']))
+    
+    def _ingest_steps(self, steps: List[Dict], workflow_info: Dict) -> bool:
+        """Update step information, progress and step errors in a single pass over the steps.
         
+        Returns whether any step was added, removed or changed state.
+        """
+        processed_steps = workflow_info['steps']
+        errors = workflow_info['errors']
         completed = 0
-        total = len(steps)
+        seen_steps = 0
+        changed = False
         
         for step in steps:
             state = step.get('state', '')
-            if state in ['ok', 'error', 'deleted']:
+            if state in TERMINAL_STATES:
                 completed += 1
-        
-        return (completed / total) * 100 if total > 0 else 0.0
-    
-    def _check_for_errors(self, steps: List[Dict], workflow_info: Dict):
-        """Check for errors in workflow steps."""
-        for step in steps:
-            state = step.get('state', '')
-            if state == 'error':
-                step_id = step.get('id')
-                step_name = step.get('workflow_step_label', step_id)
-                error_msg = f"Step '{step_name}' failed"
+            
+            step_id = step.get('id')
+            if step_id:
+                seen_steps += 1
+                step_info = processed_steps.get(step_id)
                 
-                if error_msg not in workflow_info['errors']:
-                    workflow_info['errors'].append(error_msg)
+                # Only steps seen for the first time get a new dict
+                if step_info is None:
+                    changed = True
+                    processed_steps[step_id] = {
+                        'id': step_id,
+                        'name': step.get('workflow_step_label', step_id),
+                        'state': step.get('state', 'unknown'),
+                        'job_id': step.get('job_id'),
+                        'start_time': step.get('update_time'),
+                        'end_time': None,
+                        'error': None
+                    }
+                else:
+                    if step_info['state'] != step.get('state', 'unknown'):
+                        changed = True
+                    step_info['name'] = step.get('workflow_step_label', step_id)
+                    step_info['state'] = step.get('state', 'unknown')
+                    step_info['job_id'] = step.get('job_id')
+                    step_info['start_time'] = step.get('update_time')
+            
+            # Check for errors, reporting each failed step once
+            if state == 'error':
+                errors.setdefault(f"Step '{step.get('workflow_step_label', step_id)}' failed")
+        
+        # Drop steps Galaxy no longer reports
+        if len(processed_steps) > seen_steps:
+            changed = True
+            current_ids = {step.get('id') for step in steps}
+            for step_id in [i for i in processed_steps if i not in current_ids]:
+                del processed_steps[step_id]
+        
+        # Calculate progress
+        workflow_info['progress'] = (completed / len(steps)) * 100 if steps else 0.0
+        return changed
     
     def cleanup_old_workflows(self, max_age_hours: int = 24):
         """Clean up old completed workflows."""
-        cutoff_time = datetime.now().timestamp() - (max_age_hours * 3600)
+        cutoff_time = time.monotonic() - (max_age_hours * 3600)
         
-        with self.lock:
-            to_remove = []
-            for invocation_id, workflow_info in self.active_workflows.items():
-                if workflow_info['state'] in ['ok', 'error', 'deleted']:
-                    end_time = workflow_info.get('end_time')
-                    if end_time and end_time.timestamp() < cutoff_time:
-                        to_remove.append(invocation_id)
-            
-            for invocation_id in to_remove:
-                del self.active_workflows[invocation_id]
-                logger.info(f"Cleaned up old workflow: {invocation_id}")
+        for shard_index, (shard_lock, workflows) in enumerate(self.shards):
+            with shard_lock:
+                to_remove = []
+                for invocation_id, workflow_info in workflows.items():
+                    if workflow_info['state'] in FINISHED_STATES:
+                        end_time = workflow_info.get('end_time')
+                        if end_time and end_time < cutoff_time:
+                            to_remove.append(invocation_id)
+                
+                for invocation_id in to_remove:
+                    self._count_state_change(workflows.pop(invocation_id)['state'], None)
+                    self._drop_listeners(invocation_id)
+                    logger.info(f"Cleaned up old workflow: {invocation_id}")
+                
+                if to_remove:
+                    self._publish_snapshot(shard_index, to_remove)
 
     def get_workflow_statistics(self) -> Dict:
         """Get workflow tracking statistics."""
-        with self.lock:
-            total_workflows = len(self.active_workflows)
-            running_workflows = len([w for w in self.active_workflows.values() if w['state'] == 'running'])
-            completed_workflows = len([w for w in self.active_workflows.values() if w['state'] in ['ok', 'error', 'deleted']])
-            failed_workflows = len([w for w in self.active_workflows.values() if w['state'] == 'error'])
-            
-            return {
-                'total_workflows': total_workflows,
-                'running_workflows': running_workflows,
-                'completed_workflows': completed_workflows,
-                'failed_workflows': failed_workflows,
-                'success_rate': (completed_workflows - failed_workflows) / max(completed_workflows, 1) * 100
-            }
+        with self._state_counts_lock:
+            state_counts = self._state_counts.copy()
+        total_workflows = sum(state_counts.values())
+        running_workflows = state_counts['running']
+        completed_workflows = sum(state_counts[state] for state in FINISHED_STATES)
+        failed_workflows = sum(state_counts[state] for state in FAILED_STATES)
+        
+        return {
+            'total_workflows': total_workflows,
+            'running_workflows': running_workflows,
+            'completed_workflows': completed_workflows,
+            'failed_workflows': failed_workflows,
+            'success_rate': (completed_workflows - failed_workflows) / max(completed_workflows, 1) * 100
+        }
 
 # Global workflow tracker instance
 workflow_tracker = None
@@ -241,8 +631,9 @@ def get_workflow_tracker(galaxy_instance: GalaxyInstance) -> WorkflowTracker:
     
     return workflow_tracker
 
-def track_workflow_execution(galaxy_instance: GalaxyInstance, workflow_id: str, invocation_id: str):
+def track_workflow_execution(galaxy_instance: GalaxyInstance, workflow_id: str, invocation_id: str,
+                             history_id: Optional[str] = None):
     """Start tracking a workflow execution."""
     tracker = get_workflow_tracker(galaxy_instance)
-    tracker.start_tracking(workflow_id, invocation_id)
+    tracker.start_tracking(workflow_id, invocation_id, history_id)
     return tracker
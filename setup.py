@@ -22,15 +22,12 @@ def read_readme():
             return f.read()
     return "Galaksio 2 - Modern Galaxy Workflow Interface"
 
-# Read version from VERSION file
+# Read version from server/__about__.py
 def read_version():
-    version_path = os.path.join(os.path.dirname(__file__), 'VERSION')
-    if os.path.exists(version_path):
-        with open(version_path, 'r') as f:
-            for line in f:
-                if 'Galaksio v' in line:
-                    return line.split('v')[1].split(' ')[0]
-    return "0.4.0"
+    about = {}
+    with open(os.path.join(os.path.dirname(__file__), 'server', '__about__.py'), 'r') as f:
+        exec(f.read(), about)
+    return about['__version__']
 
 setup(
     name="galaksio",
@@ -17,178 +17,183 @@ from servlets.GalaxyAPI import get_galaxy_instance, get_auth_handler
 from servlets.AuthHandler import authenticate_galaxy
 from resources.galaxy_settings import settings
 
+def _mk_mock_gi(version='25.0', api='v2'):
+    """Create a mock Galaxy instance reporting the given version, with one workflow and one history."""
+    gi = Mock()
+    gi.url = "https://test.galaxy.org"
+    gi.key = "test_api_key"
+    
+    gi.config.get_version.return_value = {
+        'version_major': version,
+        'api_version': api
+    }
+    
+    gi.workflows.get_workflows.return_value = [
+        {'id': 'test_workflow', 'name': 'Test Workflow'}
+    ]
+    gi.workflows.show_workflow.return_value = {
+        'id': 'test_workflow',
+        'inputs': {'input1': {'type': 'data'}}
+    }
+    
+    gi.invocations.get_invocations.return_value = []
+    
+    gi.histories.get_histories.return_value = [
+        {'id': 'test_history', 'name': 'Test History'}
+    ]
+    gi.histories.show_history.return_value = []
+    return gi
+
 class TestGalaxyCompatibility(unittest.TestCase):
     """Test Galaxy API compatibility across versions."""
     
     def setUp(self):
-        """Set up test fixtures."""
-        self.mock_galaxy_instance = Mock()
-        self.mock_galaxy_instance.url = "https://test.galaxy.org"
-        self.mock_galaxy_instance.key = "test_api_key"
-        
+        # Detail caches are shared by all verifiers, so start every test empty
+        GalaxyAPIVerifier._workflow_cache.clear()
+        GalaxyAPIVerifier._invocation_cache.clear()
+    
     def test_verifier_initialization(self):
         """Test Galaxy API verifier initialization."""
-        with patch.object(self.mock_galaxy_instance, 'config') as mock_config:
-            mock_config.get_version.return_value = {
-                'version_major': '25.0',
-                'api_version': 'v2'
-            }
-            
-            verifier = GalaxyAPIVerifier(self.mock_galaxy_instance)
-            
-            self.assertEqual(verifier.galaxy_version, '25.0')
-            self.assertEqual(verifier.api_version, 'v2')
-            self.assertTrue(verifier.is_galaxy_25_plus)
+        verifier = GalaxyAPIVerifier(_mk_mock_gi())
+        
+        self.assertEqual(verifier.galaxy_version, '25.0')
+        self.assertEqual(verifier.api_version, 'v2')
+        self.assertTrue(verifier.is_galaxy_25_plus)
     
     def test_galaxy_25_compatibility(self):
         """Test Galaxy 25.0 specific compatibility."""
-        with patch.object(self.mock_galaxy_instance, 'config') as mock_config, \
-             patch.object(self.mock_galaxy_instance, 'workflows') as mock_workflows, \
-             patch.object(self.mock_galaxy_instance, 'invocations') as mock_invocations, \
-             patch.object(self.mock_galaxy_instance, 'histories') as mock_histories:
-            
-            # Mock version info
-            mock_config.get_version.return_value = {
-                'version_major': '25.0',
-                'api_version': 'v2'
-            }
-            
-            # Mock workflows
-            mock_workflows.get_workflows.return_value = [
-                {'id': 'test_workflow', 'name': 'Test Workflow'}
-            ]
-            mock_workflows.show_workflow.return_value = {
-                'id': 'test_workflow',
-                'inputs': {'input1': {'type': 'data'}}
-            }
-            
-            # Mock invocations
-            mock_invocations.get_invocations.return_value = []
-            
-            # Mock histories
-            mock_histories.get_histories.return_value = [
-                {'id': 'test_history', 'name': 'Test History'}
-            ]
-            mock_histories.show_history.return_value = []
-            
-            verifier = GalaxyAPIVerifier(self.mock_galaxy_instance)
-            
-            # Should be compatible
-            self.assertTrue(verifier.is_compatible())
-            self.assertEqual(len(verifier.compatibility_issues), 0)
+        verifier = GalaxyAPIVerifier(_mk_mock_gi())
+        
+        # Should be compatible
+        self.assertTrue(verifier.is_compatible())
+        self.assertEqual(len(verifier.compatibility_issues), 0)
+    
+    def test_history_contents_fetched_once(self):
+        """Test histories and datasets checks share a single contents fetch."""
+        gi = _mk_mock_gi()
+        gi.histories.show_history.return_value = [
+            {'id': 'dataset1', 'name': 'Test Dataset 1'}
+        ]
+        
+        verifier = GalaxyAPIVerifier(gi)
+        
+        gi.histories.get_histories.assert_called_once()
+        gi.histories.show_history.assert_called_once_with(
+            'test_history', contents=True, deleted=False,
+            keys=GalaxyAPIVerifier.HISTORY_SAMPLE_KEYS
+        )
+        self.assertFalse(any('histories' in issue or 'datasets' in issue
+                             for issue in verifier.compatibility_issues))
     
     def test_legacy_galaxy_compatibility(self):
         """Test compatibility with older Galaxy versions."""
-        with patch.object(self.mock_galaxy_instance, 'config') as mock_config, \
-             patch.object(self.mock_galaxy_instance, 'workflows') as mock_workflows, \
-             patch.object(self.mock_galaxy_instance, 'histories') as mock_histories:
-            
-            # Mock older version info
-            mock_config.get_version.return_value = {
-                'version_major': '21.09',
-                'api_version': 'v1'
-            }
-            
-            # Mock basic endpoints
-            mock_workflows.get_workflows.return_value = [
-                {'id': 'test_workflow', 'name': 'Test Workflow'}
-            ]
-            mock_workflows.show_workflow.return_value = {
-                'id': 'test_workflow',
-                'inputs': {'input1': {'type': 'data'}}
-            }
-            
-            mock_histories.get_histories.return_value = [
-                {'id': 'test_history', 'name': 'Test History'}
-            ]
-            mock_histories.show_history.return_value = []
-            
-            verifier = GalaxyAPIVerifier(self.mock_galaxy_instance)
-            
-            # Should still be compatible with basic features
-            self.assertTrue(verifier.is_compatible())
-            self.assertFalse(verifier.is_galaxy_25_plus)
+        verifier = GalaxyAPIVerifier(_mk_mock_gi(version='21.09', api='v1'))
+        
+        # Should still be compatible with basic features
+        self.assertTrue(verifier.is_compatible())
+        self.assertFalse(verifier.is_galaxy_25_plus)
     
     def test_workflow_invocation_compatibility(self):
         """Test workflow invocation compatibility."""
-        with patch.object(self.mock_galaxy_instance, 'config') as mock_config:
-            mock_config.get_version.return_value = {
-                'version_major': '25.0',
-                'api_version': 'v2'
-            }
-            
-            verifier = GalaxyAPIVerifier(self.mock_galaxy_instance)
-            
-            # Test Galaxy 25.0+ method
-            with patch.object(self.mock_galaxy_instance.workflows, 'invoke_workflow') as mock_invoke:
-                mock_invoke.return_value = {'id': 'test_invocation'}
-                
-                result = verifier.get_safe_workflow_invocation(
-                    'test_workflow',
-                    'test_history',
-                    {'input1': 'test_input'},
-                    {'param1': 'test_param'}
-                )
-                
-                self.assertEqual(result['id'], 'test_invocation')
-                mock_invoke.assert_called_once_with(
-                    workflow_id='test_workflow',
-                    history_id='test_history',
-                    inputs={'input1': 'test_input'},
-                    params={'param1': 'test_param'},
-                    import_inputs_to_history=True
-                )
+        gi = _mk_mock_gi()
+        verifier = GalaxyAPIVerifier(gi)
+        
+        # Test Galaxy 25.0+ method
+        gi.workflows.invoke_workflow.return_value = {'id': 'test_invocation'}
+        
+        result = verifier.get_safe_workflow_invocation(
+            'test_workflow',
+            'test_history',
+            {'input1': 'test_input'},
+            {'param1': 'test_param'}
+        )
+        
+        self.assertEqual(result['id'], 'test_invocation')
+        gi.workflows.invoke_workflow.assert_called_once_with(
+            workflow_id='test_workflow',
+            history_id='test_history',
+            inputs={'input1': 'test_input'},
+            params={'param1': 'test_param'},
+            import_inputs_to_history=True
+        )
+    
+    def test_workflow_invocation_transient_error_not_retried(self):
+        """Test network failures are raised instead of resent via the legacy method."""
+        import bioblend
+        
+        gi = _mk_mock_gi()
+        verifier = GalaxyAPIVerifier(gi)
+        
+        gi.workflows.invoke_workflow.side_effect = bioblend.ConnectionError("Bad gateway", status_code=502)
+        
+        with self.assertRaises(bioblend.ConnectionError):
+            verifier.get_safe_workflow_invocation('test_workflow', 'test_history', {})
+        
+        gi.workflows.invoke_workflow.assert_called_once()
     
     def test_collection_creation_compatibility(self):
         """Test collection creation compatibility."""
-        with patch.object(self.mock_galaxy_instance, 'config') as mock_config:
-            mock_config.get_version.return_value = {
-                'version_major': '25.0',
-                'api_version': 'v2'
-            }
-            
-            verifier = GalaxyAPIVerifier(self.mock_galaxy_instance)
-            
-            collection_description = {
-                'collection_type': 'paired',
-                'name': 'test_collection',
-                'elements': [
-                    {'name': 'forward', 'src': 'hda', 'id': 'test_id_1'},
-                    {'name': 'reverse', 'src': 'hda', 'id': 'test_id_2'}
-                ]
-            }
-            
-            # Test Galaxy 25.0+ method
-            with patch.object(self.mock_galaxy_instance.histories, 'create_dataset_collection') as mock_create:
-                mock_create.return_value = {'id': 'test_collection'}
-                
-                result = verifier.create_safe_collection('test_history', collection_description)
-                
-                self.assertEqual(result['id'], 'test_collection')
-                mock_create.assert_called_once()
+        gi = _mk_mock_gi()
+        verifier = GalaxyAPIVerifier(gi)
+        
+        collection_description = {
+            'collection_type': 'paired',
+            'name': 'test_collection',
+            'elements': [
+                {'name': 'forward', 'src': 'hda', 'id': 'test_id_1'},
+                {'name': 'reverse', 'src': 'hda', 'id': 'test_id_2'}
+            ]
+        }
+        
+        # Test Galaxy 25.0+ method
+        gi.histories.create_dataset_collection.return_value = {'id': 'test_collection'}
+        
+        result = verifier.create_safe_collection('test_history', collection_description)
+        
+        self.assertEqual(result['id'], 'test_collection')
+        gi.histories.create_dataset_collection.assert_called_once()
     
     def test_history_contents_compatibility(self):
         """Test history contents retrieval compatibility."""
-        with patch.object(self.mock_galaxy_instance, 'config') as mock_config:
-            mock_config.get_version.return_value = {
-                'version_major': '25.0',
-                'api_version': 'v2'
-            }
-            
-            verifier = GalaxyAPIVerifier(self.mock_galaxy_instance)
-            
-            # Test safe history contents retrieval
-            with patch.object(self.mock_galaxy_instance.histories, 'show_history') as mock_show:
-                mock_show.return_value = [
-                    {'id': 'dataset1', 'name': 'Test Dataset 1'},
-                    {'id': 'dataset2', 'name': 'Test Dataset 2'}
-                ]
-                
-                result = verifier.get_safe_history_contents('test_history', contents=True)
-                
-                self.assertEqual(len(result), 2)
-                self.assertEqual(result[0]['id'], 'dataset1')
-                mock_show.assert_called_once_with('test_history', contents=True)
+        gi = _mk_mock_gi()
+        verifier = GalaxyAPIVerifier(gi)
+        
+        # Test safe history contents retrieval
+        gi.histories.show_history.reset_mock()
+        gi.histories.show_history.return_value = [
+            {'id': 'dataset1', 'name': 'Test Dataset 1'},
+            {'id': 'dataset2', 'name': 'Test Dataset 2'}
+        ]
+        
+        result = verifier.get_safe_history_contents('test_history', contents=True)
+        
+        self.assertEqual(len(result), 2)
+        self.assertEqual(result[0]['id'], 'dataset1')
+        gi.histories.show_history.assert_called_once_with('test_history', contents=True)
+    
+    def test_workflow_details_cached(self):
+        """Test repeated workflow detail lookups hit Galaxy once."""
+        gi = _mk_mock_gi()
+        verifier = GalaxyAPIVerifier(gi)
+        
+        gi.workflows.show_workflow.reset_mock()
+        gi.workflows.show_workflow.return_value = {'id': 'test_workflow', 'inputs': {}}
+        
+        first = verifier.get_safe_workflow_details('test_workflow')
+        second = verifier.get_safe_workflow_details('test_workflow')
+        
+        self.assertEqual(first, second)
+        gi.workflows.show_workflow.assert_called_once_with('test_workflow')
+    
+    def test_cached_workflow_details_isolated(self):
+        """Test changes to returned workflow details do not reach the cache."""
+        gi = _mk_mock_gi()
+        verifier = GalaxyAPIVerifier(gi)
+        gi.workflows.show_workflow.return_value = {'id': 'test_workflow', 'inputs': {}}
+        
+        verifier.get_safe_workflow_details('test_workflow')['inputs']['extra'] = {'type': 'data'}
+        
+        self.assertEqual(verifier.get_safe_workflow_details('test_workflow')['inputs'], {})
 
 class TestGalaxyAPIIntegration(unittest.TestCase):
     """Test Galaxy API integration with compatibility layer."""
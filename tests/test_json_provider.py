@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+JSON Provider Test Suite
+Tests that orjson-backed responses match Flask's default JSON provider.
+"""
+
+import unittest
+import sys
+import os
+import datetime
+import decimal
+import math
+import uuid
+
+from flask import Flask, jsonify
+from flask.json.provider import DefaultJSONProvider
+
+# Add server directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from servlets.JSONProvider import OrjsonProvider
+
+class TestOrjsonProvider(unittest.TestCase):
+    """Test JSON output against Flask's default provider."""
+    
+    CASES = {
+        'dates': {
+            'aware': datetime.datetime(2024, 5, 1, 12, 30, tzinfo=datetime.timezone.utc),
+            'naive': datetime.datetime(2024, 5, 1, 12, 30),
+            'day': datetime.date(2024, 5, 1)
+        },
+        'uuid_decimal': {'id': uuid.UUID(int=1), 'amount': decimal.Decimal('1.50')},
+        'sorted_keys': {'b': 1, 'a': {'z': [1, 2, {}], 'y': []}, 'c': None},
+        'non_string_keys': {10: 'ten', 2: 'two', True: 'true', 2.5: 'float'},
+        'non_ascii': {'name': 'Ångström ✓ 😀', 'control': '\x01\n\x7f'},
+        'big_integer': [2 ** 70, 1.5, 'x']
+    }
+    
+    def _mk_app(self, provider_class, debug=False):
+        """Create an app using the given JSON provider."""
+        app = Flask(__name__)
+        app.debug = debug
+        app.json = provider_class(app)
+        return app
+    
+    def _jsonify(self, provider_class, value, debug=False):
+        """Get the body jsonify writes for a value."""
+        app = self._mk_app(provider_class, debug)
+        with app.app_context():
+            return jsonify(value).get_data()
+    
+    def test_compact_response_matches_default(self):
+        """Test compact jsonify output is byte for byte the default provider's."""
+        for name, value in self.CASES.items():
+            with self.subTest(case=name):
+                self.assertEqual(self._jsonify(OrjsonProvider, value),
+                                 self._jsonify(DefaultJSONProvider, value))
+    
+    def test_debug_response_matches_default(self):
+        """Test indented jsonify output in debug mode is byte for byte the default provider's."""
+        for name, value in self.CASES.items():
+            with self.subTest(case=name):
+                self.assertEqual(self._jsonify(OrjsonProvider, value, debug=True),
+                                 self._jsonify(DefaultJSONProvider, value, debug=True))
+    
+    def test_dumps_matches_default(self):
+        """Test app.json.dumps output matches the default provider's."""
+        for name, value in self.CASES.items():
+            with self.subTest(case=name):
+                self.assertEqual(self._mk_app(OrjsonProvider).json.dumps(value),
+                                 self._mk_app(DefaultJSONProvider).json.dumps(value))
+    
+    def test_non_ascii_escaped(self):
+        """Test non-ASCII characters are escaped, with surrogate pairs beyond the BMP."""
+        body = self._jsonify(OrjsonProvider, {'name': 'Å😀'})
+        self.assertEqual(body, b'{"name":"\\u00c5\\ud83d\\ude00"}\n')
+    
+    def test_unsortable_keys_raise(self):
+        """Test keys the default provider cannot sort still raise a TypeError."""
+        with self.assertRaises(TypeError):
+            self._jsonify(OrjsonProvider, {1: 'one', 'a': 'letter'})
+    
+    def test_loads(self):
+        """Test parsing, including values only the stdlib decoder accepts."""
+        json_provider = self._mk_app(OrjsonProvider).json
+        self.assertEqual(json_provider.loads('{"a": [1, "Å"]}'), {'a': [1, 'Å']})
+        self.assertEqual(json_provider.loads(str(2 ** 70)), 2 ** 70)
+        self.assertTrue(math.isnan(json_provider.loads('[NaN]')[0]))
+
+if __name__ == '__main__':
+    unittest.main()
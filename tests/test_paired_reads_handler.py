@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Paired Reads Handler Test Suite
+Tests paired-end read detection and paired collection creation.
+"""
+
+import unittest
+import sys
+import os
+from unittest.mock import Mock, patch
+
+import bioblend
+
+# Add server directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+import servlets.GalaxyAPIVerifier as GalaxyAPIVerifierModule
+from servlets.GalaxyAPIVerifier import GalaxyAPIVerifier
+from servlets.PairedReadsHandler import PairedReadsHandler
+
+def _mk_mock_gi(dataset_names):
+    """Create a mock Galaxy 25.0 instance whose history holds datasets with the given names."""
+    gi = Mock()
+    gi.url = "https://test.galaxy.org"
+    gi.key = "test_api_key"
+    gi.config.get_version.return_value = {
+        'version_major': '25.0',
+        'api_version': 'v2'
+    }
+    gi.workflows.get_workflows.return_value = []
+    gi.invocations.get_invocations.return_value = []
+    gi.histories.get_histories.return_value = []
+    gi.histories.show_history.return_value = [
+        {'id': f'dataset{index}', 'name': name, 'file_size': 1000, 'data_type': 'fastqsanger'}
+        for index, name in enumerate(dataset_names)
+    ]
+    return gi
+
+class TestPairedReadsHandler(unittest.TestCase):
+    """Test paired read detection and collection creation."""
+    
+    DATASET_NAMES = [
+        'sampleA_R1.fastq', 'sampleA_R2.fastq',
+        'sampleB_1.fq', 'sampleB_2.fq',
+        'sampleC.R1.fastq', 'sampleC.R2.fastq',
+        'sampleD_forward.fasta', 'sampleD_reverse.fasta',
+        'sampleE_R1_001.fastq.gz', 'sampleE_R2_001.fastq.gz',
+        'SampleF_r1.FASTQ', 'sampleF_R2.fastq',
+        'lonely_R1.fastq', 'reads.bam', 'notes.txt'
+    ]
+    
+    def _mk_handler(self, dataset_names):
+        """Create a handler for a mock Galaxy instance, with its own verifier."""
+        self.gi = _mk_mock_gi(dataset_names)
+        verifier = GalaxyAPIVerifier(self.gi)
+        patcher = patch.object(GalaxyAPIVerifierModule, 'get_api_verifier', return_value=verifier)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return PairedReadsHandler(self.gi)
+    
+    def test_mate_name(self):
+        """Test mate names for each pair indicator, lower-cased."""
+        expected = {
+            'a_r1.fastq': 'a_r2.fastq',
+            'a_2.fq': 'a_1.fq',
+            'a.r1.fastq': 'a.r2.fastq',
+            'a_reverse.fasta': 'a_forward.fasta',
+            'a_r1_001.fastq.gz': 'a_r2_001.fastq.gz',
+            'a_1.fq.gz': 'a_2.fq.gz',
+            'a.fastq': None,
+            # An indicator needs a base name in front of it
+            '_r1.fastq': None,
+            'r1.fastq': None
+        }
+        for name, mate_name in expected.items():
+            with self.subTest(name=name):
+                self.assertEqual(PairedReadsHandler._mate_name(name), mate_name)
+    
+    def test_detect_paired_reads(self):
+        """Test pairs, pair types and suggested names across naming conventions."""
+        handler = self._mk_handler(self.DATASET_NAMES)
+        
+        result = handler.detect_paired_reads('test_history')
+        
+        self.assertTrue(result['success'])
+        pairs = {
+            tuple(f['name'] for f in group['files']): (group['pair_type'], group['suggested_name'])
+            for group in result['paired_groups']
+        }
+        self.assertEqual(pairs, {
+            ('sampleA_R1.fastq', 'sampleA_R2.fastq'): ('illumina_r1_r2', 'sampleA_paired'),
+            ('sampleB_1.fq', 'sampleB_2.fq'): ('illumina_1_2', 'sampleB_paired'),
+            ('sampleC.R1.fastq', 'sampleC.R2.fastq'): ('unknown', 'sampleC_paired'),
+            ('sampleD_forward.fasta', 'sampleD_reverse.fasta'): ('forward_reverse', 'sampleD_paired'),
+            ('sampleE_R1_001.fastq.gz', 'sampleE_R2_001.fastq.gz'): ('illumina_r1_r2', 'sampleE_paired'),
+            ('SampleF_r1.FASTQ', 'sampleF_R2.fastq'): ('illumina_r1_r2', 'SampleF_paired')
+        })
+        self.assertEqual([group['group_id'] for group in result['paired_groups']],
+                         [f"pair_{index}" for index in range(1, 7)])
+        self.assertEqual(result['total_pairs'], 6)
+        
+        # Files without a mate stay unpaired; non-sequencing files are left out
+        self.assertEqual([f['name'] for f in result['unpaired_files']], ['lonely_R1.fastq', 'reads.bam'])
+        self.assertEqual(result['total_unpaired'], 2)
+        
+        # Returned datasets are exactly what Galaxy reported
+        for group in result['paired_groups']:
+            for dataset in group['files']:
+                self.assertEqual(set(dataset), {'id', 'name', 'file_size', 'data_type'})
+    
+    def test_pair_confidence(self):
+        """Test confidence scores for indicator, size and data type matches."""
+        handler = self._mk_handler(['a_R1.fastq', 'a_R2.fastq', 'b_forward.fq', 'b_reverse.fq'])
+        
+        confidences = {
+            group['suggested_name']: group['confidence']
+            for group in handler.detect_paired_reads('test_history')['paired_groups']
+        }
+        
+        self.assertAlmostEqual(confidences['a_paired'], 0.9)
+        self.assertAlmostEqual(confidences['b_paired'], 0.5)
+    
+    def test_auto_pair_creates_collections(self):
+        """Test high-confidence pairs become collections, reporting creations that fail."""
+        handler = self._mk_handler(['ok_R1.fastq', 'ok_R2.fastq', 'bad_R1.fastq', 'bad_R2.fastq',
+                                    'low_forward.fq', 'low_reverse.fq'])
+        
+        def create_dataset_collection(history_id, collection_description):
+            if collection_description['name'] == 'bad_paired':
+                raise bioblend.ConnectionError("Internal server error", status_code=500)
+            return {'id': f"collection_{collection_description['name']}"}
+        
+        self.gi.histories.create_dataset_collection.side_effect = create_dataset_collection
+        
+        result = handler.auto_pair_all_reads('test_history')
+        
+        self.assertTrue(result['success'])
+        self.assertEqual([c['collection_id'] for c in result['created_collections']], ['collection_ok_paired'])
+        self.assertEqual(result['summary'], {
+            'total_pairs': 3,
+            'high_confidence_pairs': 2,
+            'collections_created': 1,
+            'unpaired_count': 0
+        })
+        
+        # The low-confidence forward/reverse pair is never submitted
+        submitted = sorted(
+            call.kwargs['collection_description']['name']
+            for call in self.gi.histories.create_dataset_collection.call_args_list
+        )
+        self.assertEqual(submitted, ['bad_paired', 'ok_paired'])
+        description = next(
+            call.kwargs['collection_description']
+            for call in self.gi.histories.create_dataset_collection.call_args_list
+            if call.kwargs['collection_description']['name'] == 'ok_paired'
+        )
+        self.assertEqual(description['collection_type'], 'paired')
+        self.assertEqual([element['name'] for element in description['elements']], ['forward', 'reverse'])
+    
+    def test_supported_patterns(self):
+        """Test advertised patterns are the indicators that are matched."""
+        patterns = PairedReadsHandler.get_supported_patterns()
+        
+        pairs = {(p['pattern'], p['replacement']) for p in patterns['patterns']}
+        self.assertIn(('*_R1.<extension>', '*_R2.<extension>'), pairs)
+        self.assertIn(('*_R1_001.<extension>', '*_R2_001.<extension>'), pairs)
+        self.assertIn(('*.R2.<extension>', '*.R1.<extension>'), pairs)
+        self.assertIn(('*_forward.<extension>', '*_reverse.<extension>'), pairs)
+        self.assertEqual(len(pairs), len(PairedReadsHandler.PAIR_INDICATOR_MATES) + 4)
+        self.assertEqual(set(patterns['supported_extensions']), PairedReadsHandler.SUPPORTED_EXTENSIONS)
+
+if __name__ == '__main__':
+    unittest.main()
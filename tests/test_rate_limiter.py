@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Rate Limiter Test Suite
+Tests token bucket refill and the 429 response headers.
+"""
+
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+from flask import Flask, jsonify
+
+# Add server directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+import servlets.RateLimiter as RateLimiterModule
+from servlets.RateLimiter import RateLimiter, rate_limit
+
+class TestTokenBucket(unittest.TestCase):
+    """Test token bucket accounting."""
+    
+    def setUp(self):
+        self.limiter = RateLimiter()
+        self.limiter.set_limit('client', 2, 10)  # one token every 5 seconds
+        self.now = 1000.0
+        patcher = patch.object(RateLimiterModule.time, 'monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_bucket_exhausted(self):
+        """Test that requests beyond the capacity are rejected."""
+        self.assertTrue(self.limiter.check_rate_limit('client')['allowed'])
+        self.assertTrue(self.limiter.check_rate_limit('client')['allowed'])
+        
+        result = self.limiter.check_rate_limit('client')
+        self.assertFalse(result['allowed'])
+        self.assertEqual(result['remaining'], 0)
+        self.assertAlmostEqual(result['reset_after'], 5.0)
+    
+    def test_bucket_refill(self):
+        """Test that tokens come back at the configured rate."""
+        self.limiter.check_rate_limit('client')
+        self.limiter.check_rate_limit('client')
+        
+        self.now += 2.5
+        result = self.limiter.check_rate_limit('client')
+        self.assertFalse(result['allowed'])
+        self.assertAlmostEqual(result['reset_after'], 2.5)
+        
+        self.now += 2.5
+        self.assertTrue(self.limiter.check_rate_limit('client')['allowed'])
+        self.assertFalse(self.limiter.check_rate_limit('client')['allowed'])
+    
+    def test_bucket_refill_capped(self):
+        """Test that an idle bucket never holds more than its capacity."""
+        self.limiter.check_rate_limit('client')
+        
+        self.now += 3600
+        self.assertEqual(self.limiter.check_rate_limit('client')['remaining'], 1)
+        self.assertEqual(self.limiter.check_rate_limit('client')['remaining'], 0)
+        self.assertFalse(self.limiter.check_rate_limit('client')['allowed'])
+
+class TestRateLimitDecorator(unittest.TestCase):
+    """Test the rate limit decorator responses."""
+    
+    def setUp(self):
+        limiter = RateLimiter()
+        limiter.set_limit('test:127.0.0.1', 1, 60)
+        patcher = patch.object(RateLimiterModule, 'rate_limiter', limiter)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        
+        app = Flask(__name__)
+        
+        @app.route('/limited')
+        @rate_limit('test')
+        def limited():
+            return jsonify({'success': True})
+        
+        self.client = app.test_client()
+    
+    def test_retry_after(self):
+        """Test that a rejected request gets a 429 with Retry-After."""
+        response = self.client.get('/limited', environ_base={'REMOTE_ADDR': '127.0.0.1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-RateLimit-Limit'], '1')
+        self.assertEqual(response.headers['X-RateLimit-Remaining'], '0')
+        
+        response = self.client.get('/limited', environ_base={'REMOTE_ADDR': '127.0.0.1'})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn(response.headers['Retry-After'], ('59', '60'))
+        self.assertEqual(response.get_json()['retry_after'], int(response.headers['Retry-After']))
+        self.assertFalse(response.get_json()['success'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Security Manager Test Suite
+Tests token blacklisting and input validation.
+"""
+
+import unittest
+import sys
+import os
+from unittest.mock import patch
+
+# Add server directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+import servlets.SecurityManager as SecurityManagerModule
+from servlets.SecurityManager import SecurityManager, compile_validator
+
+class TestTokenBlacklist(unittest.TestCase):
+    """Test token blacklist rotation."""
+    
+    def setUp(self):
+        self.manager = SecurityManager('k' * 32, jwt_expiration_hours=1)
+        self.now = self.manager._blacklist_rotated_at
+        patcher = patch.object(SecurityManagerModule.time, 'monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_blacklisted_token_rejected(self):
+        """Test that a blacklisted token no longer validates."""
+        token = self.manager.generate_token('user')
+        self.assertTrue(self.manager.validate_token(token))
+        
+        self.assertTrue(self.manager.blacklist_token(token))
+        self.assertFalse(self.manager.validate_token(token))
+    
+    def test_blacklist_survives_one_rotation(self):
+        """Test that a blacklisted token stays rejected across one rotation."""
+        token = self.manager.generate_token('user')
+        self.manager.blacklist_token(token)
+        
+        self.now += 3601
+        self.assertFalse(self.manager.validate_token(token))
+        self.assertEqual(self.manager.blacklisted_jtis, set())
+        
+        # A second rotation drops it, as the token has expired by then
+        self.now += 3601
+        self.manager.validate_token(token)
+        self.assertEqual(self.manager._previous_blacklisted_jtis, set())
+
+class TestInputValidation(unittest.TestCase):
+    """Test compiled validators against direct rule checking."""
+    
+    RULES = {
+        'name': {'required': True, 'type': str, 'min_length': 3, 'max_length': 8, 'pattern': r'^[a-z]+$'},
+        'count': {'type': int, 'min_value': 1, 'max_value': 5},
+        'tag': {'custom': lambda value: None if value.startswith('#') else "tag must start with #"}
+    }
+    
+    INPUTS = [
+        {},
+        {'name': 'abc', 'count': 3, 'tag': '#x'},
+        {'name': 'AB', 'count': 0, 'tag': 'x'},
+        {'name': 'abcdefghij', 'count': 9},
+        {'name': 42, 'count': 1.5},
+        {'count': 2, 'tag': '#'}
+    ]
+    
+    def setUp(self):
+        self.manager = SecurityManager('k' * 32)
+    
+    def test_compiled_validator_parity(self):
+        """Test that a compiled validator reports the same errors as validate_input."""
+        validator = compile_validator(self.RULES)
+        
+        for data in self.INPUTS:
+            with self.subTest(data=data):
+                self.assertEqual(validator(data), self.manager.validate_input(data, self.RULES))
+    
+    def test_registered_schema(self):
+        """Test validation against a schema registered by name."""
+        self.manager.register_schema('item', self.RULES)
+        
+        self.assertEqual(self.manager.validate_input({'name': 'abc', 'count': 3, 'tag': '#x'}, 'item'),
+                         {'valid': True, 'errors': []})
+        result = self.manager.validate_input({'count': 6}, 'item')
+        self.assertFalse(result['valid'])
+        self.assertEqual(result['errors'], ['name is required', 'count must be at most 5'])
+
+if __name__ == '__main__':
+    unittest.main()
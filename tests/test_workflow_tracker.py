@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Workflow Tracker Test Suite
+Tests polling cycles against a mock Galaxy instance.
+"""
+
+import unittest
+import sys
+import os
+from unittest.mock import Mock, patch
+
+# Add server directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+from servlets.GalaxyAPIVerifier import TERMINAL_INVOCATION_STATES
+from servlets.WorkflowTracker import WorkflowTracker
+
+def _mk_invocation(invocation_id, state, history_id='test_history'):
+    """Create an invocation as Galaxy reports it, with one finished and one running step."""
+    return {
+        'id': invocation_id,
+        'history_id': history_id,
+        'state': state,
+        'steps': [
+            {'id': 'step1', 'state': 'ok', 'workflow_step_label': 'Align'},
+            {'id': 'step2', 'state': 'running', 'workflow_step_label': 'Count'}
+        ]
+    }
+
+def _mk_mock_gi(invocations):
+    """Create a mock Galaxy instance serving the given invocations, listing them as Galaxy does."""
+    gi = Mock()
+    invocations_by_id = {invocation['id']: invocation for invocation in invocations}
+    
+    def get_invocations(history_id=None, include_terminal=True, **kwargs):
+        return [
+            invocation for invocation in invocations
+            if (history_id is None or invocation['history_id'] == history_id)
+            and (include_terminal or invocation['state'] not in TERMINAL_INVOCATION_STATES)
+        ]
+    
+    gi.invocations.get_invocations.side_effect = get_invocations
+    gi.invocations.show_invocation.side_effect = invocations_by_id.get
+    return gi
+
+class TestWorkflowTracker(unittest.TestCase):
+    """Test workflow tracking cycles."""
+    
+    def setUp(self):
+        # Cycles are driven by the tests rather than the tracking thread
+        patcher = patch.object(WorkflowTracker, '_start_background_tracking')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        
+    def _mk_tracker(self, invocations):
+        """Create a tracker polling a mock Galaxy instance serving the given invocations."""
+        self.gi = _mk_mock_gi(invocations)
+        tracker = WorkflowTracker(self.gi)
+        self.addCleanup(tracker.executor.shutdown)
+        self.addCleanup(tracker._listener_executor.shutdown)
+        return tracker
+    
+    def test_scheduled_invocation_ends_tracking(self):
+        """Test that a scheduled invocation is polled once and then no longer tracked as active."""
+        tracker = self._mk_tracker([_mk_invocation('test_invocation', 'scheduled')])
+        
+        tracker.start_tracking('test_workflow', 'test_invocation', 'test_history')
+        tracker._update_workflow_states()
+        
+        status = tracker.get_workflow_status('test_invocation')
+        self.assertEqual(status['state'], 'scheduled')
+        self.assertIsNotNone(status['end_time'])
+        self.assertEqual(status['progress'], 50.0)
+        self.assertEqual(status['steps']['step1']['name'], 'Align')
+        self.assertEqual(status['errors'], [])
+        
+        # A finished invocation missing from the bulk request is fetched on its
+        # own, never via a listing of its history
+        self.gi.invocations.get_invocations.assert_called_once_with(
+            include_terminal=False, view='element', step_details=True
+        )
+        self.gi.invocations.show_invocation.assert_called_once_with('test_invocation')
+        
+        statistics = tracker.get_workflow_statistics()
+        self.assertEqual(statistics['completed_workflows'], 1)
+        self.assertEqual(statistics['failed_workflows'], 0)
+        
+        # Finished workflows are not polled again
+        tracker._update_workflow_states()
+        self.gi.invocations.get_invocations.assert_called_once()
+        self.gi.invocations.show_invocation.assert_called_once()
+    
+    def test_step_progress(self):
+        """Test that progress counts the steps in a terminal workflow state."""
+        invocation = _mk_invocation('test_invocation', 'ready')
+        invocation['steps'] = [
+            {'id': 'step1', 'state': 'ok', 'workflow_step_label': 'Align'},
+            {'id': 'step2', 'state': 'error', 'workflow_step_label': 'Count'},
+            {'id': 'step3', 'state': 'scheduled', 'workflow_step_label': 'Merge'},
+            {'id': 'step4', 'state': 'new', 'workflow_step_label': 'Report'}
+        ]
+        tracker = self._mk_tracker([invocation])
+        
+        tracker.start_tracking('test_workflow', 'test_invocation', 'test_history')
+        tracker._update_workflow_states()
+        
+        status = tracker.get_workflow_status('test_invocation')
+        self.assertEqual(status['progress'], 50.0)
+        self.assertEqual(status['errors'], ["Step 'Count' failed"])
+        self.assertIsNone(status.get('end_time'))
+    
+    def test_workflow_statistics(self):
+        """Test that statistics count finished invocations and failures among them."""
+        states = ['scheduled', 'scheduled', 'cancelled', 'failed', 'ready']
+        invocations = [
+            _mk_invocation(f'invocation{index}', state, f'history{index}') for index, state in enumerate(states)
+        ]
+        tracker = self._mk_tracker(invocations)
+        
+        for invocation in invocations:
+            tracker.start_tracking('test_workflow', invocation['id'], invocation['history_id'])
+        tracker._update_workflow_states()
+        
+        statistics = tracker.get_workflow_statistics()
+        self.assertEqual(statistics['total_workflows'], 5)
+        self.assertEqual(statistics['completed_workflows'], 4)
+        self.assertEqual(statistics['failed_workflows'], 1)
+        self.assertEqual(statistics['success_rate'], 75.0)
+    
+    def test_one_request_per_cycle(self):
+        """Test that running invocations in separate histories are all polled with one request."""
+        invocations = [
+            _mk_invocation(f'invocation{index}', 'ready', f'history{index}') for index in range(5)
+        ]
+        tracker = self._mk_tracker(invocations)
+        
+        for invocation in invocations:
+            tracker.start_tracking('test_workflow', invocation['id'], invocation['history_id'])
+        tracker._update_workflow_states()
+        
+        self.gi.invocations.get_invocations.assert_called_once_with(
+            include_terminal=False, view='element', step_details=True
+        )
+        self.gi.invocations.show_invocation.assert_not_called()
+        for invocation in invocations:
+            status = tracker.get_workflow_status(invocation['id'])
+            self.assertEqual(status['state'], 'ready')
+            self.assertIsNone(status.get('end_time'))
+    
+    def test_failed_bulk_request_polls_individually(self):
+        """Test that invocations are still polled when the bulk request fails."""
+        tracker = self._mk_tracker([_mk_invocation('test_invocation', 'ready')])
+        self.gi.invocations.get_invocations.side_effect = Exception("Service unavailable")
+        
+        tracker.start_tracking('test_workflow', 'test_invocation', 'test_history')
+        tracker._update_workflow_states()
+        
+        self.gi.invocations.show_invocation.assert_called_once_with('test_invocation')
+        self.assertEqual(tracker.get_workflow_status('test_invocation')['state'], 'ready')
+    
+    def test_due_invocations_batched_per_history(self):
+        """Test that several finished invocations of one history are fetched in one request."""
+        tracker = self._mk_tracker([
+            _mk_invocation('invocation1', 'scheduled'),
+            _mk_invocation('invocation2', 'failed')
+        ])
+        
+        tracker.start_tracking('test_workflow', 'invocation1', 'test_history')
+        tracker.start_tracking('test_workflow', 'invocation2', 'test_history')
+        tracker._update_workflow_states()
+        
+        self.assertEqual(self.gi.invocations.get_invocations.call_count, 2)
+        self.gi.invocations.get_invocations.assert_called_with(
+            history_id='test_history', include_terminal=True, view='element', step_details=True
+        )
+        self.gi.invocations.show_invocation.assert_not_called()
+        
+        self.assertEqual(tracker.get_workflow_status('invocation1')['state'], 'scheduled')
+        failed_status = tracker.get_workflow_status('invocation2')
+        self.assertEqual(failed_status['state'], 'failed')
+        self.assertIn("Workflow execution failed", failed_status['errors'])
+        self.assertEqual(tracker.get_workflow_statistics()['failed_workflows'], 1)
+
+if __name__ == '__main__':
+    unittest.main()